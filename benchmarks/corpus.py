@@ -0,0 +1,58 @@
+import os
+import json
+
+# Input corpora shared by the benchmarks and the load test
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpora')
+MAX_INPUT_LENGTH = 2048
+
+
+def read_corpus(lang):
+    fname = os.path.join(CORPUS_DIR, lang + '.txt')
+    if not os.path.exists(fname):
+        return []
+    with open(fname, 'r', encoding='utf-8') as fIn:
+        return [line.strip() for line in fIn if len(line.strip()) > 0]
+
+
+def read_paper(lang):
+    fname = os.path.join(CORPUS_DIR, lang + '_paper.txt')
+    if not os.path.exists(fname):
+        return None
+    with open(fname, 'r', encoding='utf-8') as fIn:
+        return fIn.read()
+
+
+def read_query_log(fname):
+    """
+    Read sentence-mode queries from a query log (one JSON record
+    per line) and return them as a dictionary {lang: [sentences]}.
+    """
+    sentences = {}
+    with open(fname, 'r', encoding='utf-8') as fIn:
+        for line in fIn:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            query = record.get('query', {})
+            if query.get('mode', 'sentence') != 'sentence' or len(query.get('sentence', '')) <= 0:
+                continue
+            sentences.setdefault(record['lang'], []).append(query['sentence'])
+    return sentences
+
+
+def long_inputs(sentences, n):
+    """
+    Make n inputs of (almost) MAX_INPUT_LENGTH characters
+    out of the sentences of the corpus.
+    """
+    inputs = []
+    iSent = 0
+    for i in range(n):
+        text = ''
+        while len(text) + len(sentences[iSent % len(sentences)]) + 1 <= MAX_INPUT_LENGTH:
+            text += sentences[iSent % len(sentences)] + ' '
+            iSent += 1
+        inputs.append(text.strip())
+    return inputs
@@ -0,0 +1,146 @@
+"""
+Benchmark of the interlinear tables of paper-mode Word documents.
+
+The tables of the examples in benchmarks/corpora/<lang>_paper.txt are built
+with DocxTableBuilder, which puts together the XML of each table at once,
+and with the reference builder below, which adds them cell by cell through
+python-docx (the way PaperParser did it before). Both documents are checked
+to have the same XML; --save writes them to a directory so that they can
+be compared in Word.
+
+Usage:
+    python benchmarks/docx_tables.py --lang beserman --repeat 50
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import argparse
+import contextlib
+from lxml import etree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from web_app.settings import load_settings
+from web_app.analyzer import Analyzer, PaperParser
+from web_app.docx_tables import DocxTableBuilder
+from corpus import read_paper
+from run_benchmarks import measure
+
+
+def reference_table(wordDoc, lang, num, words, glosses, trans):
+    """
+    Add the table of one example to the document with python-docx.
+    """
+    nCharsWords = len(''.join(w.strip() for w in words))
+    nCharsGloss = len(''.join(re.sub('[а-яё][а-яё ,.\\-()]+',
+                                     'XXXXXX', g.strip()) for g in glosses))
+    nRows = max(nCharsWords // 56, nCharsGloss // 76) + 1
+    nCols = 1 + math.ceil(len(words) / nRows)
+    table = wordDoc.add_table(rows=nRows * 2 + 1, cols=nCols)
+    p = table.cell(0, 0).paragraphs[0]
+    p.text = '(' + str(num) + ')'
+    PaperParser.p_no_margins(wordDoc, p)
+    for iRow in range(nRows):
+        p = table.cell(iRow + 1, 0).paragraphs[0]
+        PaperParser.p_no_margins(wordDoc, p)
+        p = table.cell(iRow + 2, 0).paragraphs[0]
+        PaperParser.p_no_margins(wordDoc, p)
+    for iCell in range(len(words)):
+        if iCell >= len(glosses):
+            break
+        iRow = iCell // (nCols - 1)
+        iCol = iCell - iRow * (nCols - 1) + 1
+        if iCell >= 1:
+            table.cell(nRows * 2, 1).merge(table.cell(nRows * 2, iCol))
+        p = table.cell(iRow * 2, iCol).paragraphs[0]
+        p.add_run(words[iCell].strip()).italic = True
+        PaperParser.p_no_margins(wordDoc, p)
+        p = table.cell(iRow * 2 + 1, iCol).paragraphs[0]
+        p.style = wordDoc.styles['Gloss']
+        PaperParser.p_no_margins(wordDoc, p, 'Gloss')
+        if re.search('^(?:[ /*?!.,()_-]*|\\[S[0-9]+\\]:?)$', words[iCell].strip()) is not None:
+            continue
+        PaperParser.smallcaps_glosses(p, glosses[iCell].strip(), lang)
+    p = table.cell(nRows * 2, 1).paragraphs[0]
+    p.text = trans
+    PaperParser.p_no_margins(wordDoc, p)
+    table.autofit = True
+
+
+def read_examples(a, pp, lang, text):
+    """
+    Return the examples of a paper-mode text as a list of
+    (number, words, glosses, translation) tuples.
+    """
+    examples = []
+    text = PaperParser.clean_punc('\n' + text.strip() + '\n')
+    for seg in pp.rxExamples.findall(text):
+        if len(seg[1]) > 0 and re.search('^[ \t]*$', seg[1]) is None:
+            words, glosses = pp.words_glosses(lang, a.analyze(lang, seg[1]))
+            examples.append((seg[0], words, glosses, seg[2]))
+    return examples
+
+
+def build_reference(lang, examples):
+    wordDoc = PaperParser.new_document()
+    for num, words, glosses, trans in examples:
+        reference_table(wordDoc, lang, num, words, glosses, trans)
+    return wordDoc
+
+
+def build_fast(lang, examples):
+    wordDoc = PaperParser.new_document()
+    builder = DocxTableBuilder(wordDoc, PaperParser.gloss_runs)
+    for num, words, glosses, trans in examples:
+        builder.add_table(lang, num, words, glosses, trans)
+    return wordDoc
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the interlinear tables of Word documents.')
+    parser.add_argument('--lang', default='beserman', help='language with a paper-mode corpus')
+    parser.add_argument('--repeat', type=int, default=50, help='how many documents to build with each builder')
+    parser.add_argument('--save', help='write both documents to this directory')
+    args = parser.parse_args()
+
+    paper = read_paper(args.lang)
+    if paper is None:
+        print('No paper-mode corpus for ' + args.lang, file=sys.stderr)
+        sys.exit(1)
+    settings = load_settings()
+    settings['preload_languages'] = []
+    settings['pool_workers'] = 0
+    settings['languages'] = [args.lang]
+    a = Analyzer(settings)
+    pp = PaperParser(a)
+    with contextlib.redirect_stdout(sys.stderr):
+        examples = read_examples(a, pp, args.lang, paper)
+
+    referenceDoc = build_reference(args.lang, examples)
+    fastDoc = build_fast(args.lang, examples)
+    identical = etree.tostring(referenceDoc.element) == etree.tostring(fastDoc.element)
+    if args.save is not None:
+        os.makedirs(args.save, exist_ok=True)
+        referenceDoc.save(os.path.join(args.save, args.lang + '_reference.docx'))
+        fastDoc.save(os.path.join(args.save, args.lang + '_fast.docx'))
+
+    results = {
+        'lang': args.lang,
+        'examples': len(examples),
+        'identical': identical,
+        'reference': measure(lambda ex: build_reference(args.lang, ex), [examples], args.repeat),
+        'fast': measure(lambda ex: build_fast(args.lang, ex), [examples], args.repeat)
+    }
+    results['speedup'] = results['reference']['mean_ms'] / results['fast']['mean_ms']
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if not identical:
+        print('The documents differ.', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+HTTP load test for the web interface. Sends /<lang>/analyze requests in
+sentence and paper mode to a local instance of the app from several threads
+and reports throughput, latency percentiles and errors for each time interval
+and for the whole run. The request mix is set by weights, e.g.
+"--langs beserman:3 udmurt:1 --modes sentence:9 paper:1 --lengths short:4 long:1".
+The texts are taken from the corpora in benchmarks/corpora, so no network
+access other than to the tested server is needed. The same texts are sent
+over and over, so the requests carry "Cache-Control: no-cache", which makes
+the server analyze them instead of answering from its response cache or
+the paper-mode segment cache; --response-cache lets the cached responses
+be used. The token, analysis store, transliteration and render caches
+are used as configured.
+
+If --server is given, the command is started before the test (e.g. to compare
+WSGI server settings) and stopped afterwards:
+    python benchmarks/load_test.py --server "gunicorn -w 4 -b 127.0.0.1:5000 web_app:app"
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import random
+import argparse
+import threading
+import subprocess
+import urllib.parse
+import urllib.request
+import urllib.error
+
+from corpus import read_corpus, read_paper, long_inputs
+
+
+def parse_weights(values):
+    """
+    Turn a list of "name:weight" strings into a dictionary.
+    """
+    weights = {}
+    for value in values:
+        name, _, weight = value.partition(':')
+        weights[name] = float(weight) if len(weight) > 0 else 1.0
+    return weights
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class RequestMix:
+    """
+    Random choice of the language, mode and text of the next request.
+    """
+
+    def __init__(self, langs, modes, lengths, seed):
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.texts = {}
+        for lang in langs:
+            sentences = read_corpus(lang)
+            if len(sentences) <= 0:
+                raise ValueError('No corpus for ' + lang)
+            self.texts[(lang, 'sentence', 'short')] = sentences
+            self.texts[(lang, 'sentence', 'long')] = long_inputs(sentences, 4)
+            paper = read_paper(lang)
+            if paper is not None:
+                # Paper-mode texts come in one length only
+                self.texts[(lang, 'paper', None)] = [paper]
+        self.choices = []
+        self.weights = []
+        for lang, langWeight in langs.items():
+            for mode, modeWeight in modes.items():
+                if (lang, mode, None) in self.texts:
+                    self.choices.append((lang, mode, None))
+                    self.weights.append(langWeight * modeWeight)
+                    continue
+                for length, lengthWeight in lengths.items():
+                    if (lang, mode, length) in self.texts:
+                        self.choices.append((lang, mode, length))
+                        self.weights.append(langWeight * modeWeight * lengthWeight)
+        if len(self.choices) <= 0:
+            raise ValueError('Empty request mix.')
+
+    def next(self):
+        with self.lock:
+            lang, mode, length = self.random.choices(self.choices, self.weights)[0]
+            text = self.random.choice(self.texts[(lang, mode, length)])
+        return lang, mode, text
+
+
+class Stats:
+    """
+    Latencies and errors collected during the test, by time interval.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.intervals = {}
+
+    def add(self, latency, error):
+        nInterval = int((time.perf_counter() - self.start) / self.interval)
+        with self.lock:
+            if nInterval not in self.intervals:
+                self.intervals[nInterval] = {'latencies': [], 'errors': {}}
+            self.intervals[nInterval]['latencies'].append(latency)
+            if error is not None:
+                errors = self.intervals[nInterval]['errors']
+                errors[error] = errors.get(error, 0) + 1
+
+    @staticmethod
+    def summary(latencies, errors, seconds):
+        result = {
+            'requests': len(latencies),
+            'throughput': len(latencies) / seconds,
+            'errors': sum(errors.values()),
+            'error_rate': sum(errors.values()) / len(latencies) if len(latencies) > 0 else 0,
+            'error_types': errors
+        }
+        if len(latencies) > 0:
+            result['p50_ms'] = percentile(latencies, 50) * 1000
+            result['p90_ms'] = percentile(latencies, 90) * 1000
+            result['p99_ms'] = percentile(latencies, 99) * 1000
+            result['max_ms'] = max(latencies) * 1000
+        return result
+
+    def report(self, duration):
+        with self.lock:
+            intervals = {n: (list(v['latencies']), dict(v['errors'])) for n, v in self.intervals.items()}
+        byInterval = []
+        allLatencies = []
+        allErrors = {}
+        for n in sorted(intervals):
+            latencies, errors = intervals[n]
+            summary = Stats.summary(latencies, errors, min(self.interval, duration - n * self.interval))
+            summary['start'] = n * self.interval
+            byInterval.append(summary)
+            allLatencies += latencies
+            for error, count in errors.items():
+                allErrors[error] = allErrors.get(error, 0) + count
+        return {'total': Stats.summary(allLatencies, allErrors, duration), 'intervals': byInterval}
+
+
+def send_request(url, lang, mode, text, timeout, responseCache=False):
+    """
+    Send one analysis request. Return None if it succeeded
+    or a short description of the error. Unless responseCache is True,
+    the server is asked not to answer from its response cache.
+    """
+    data = urllib.parse.urlencode({'sentence': text, 'mode': mode}).encode('utf-8')
+    headers = {}
+    if not responseCache:
+        headers['Cache-Control'] = 'no-cache'
+    req = urllib.request.Request(url.rstrip('/') + '/' + lang + '/analyze', data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            body = response.read()
+    except urllib.error.HTTPError as e:
+        return 'HTTP ' + str(e.code)
+    except (urllib.error.URLError, OSError) as e:
+        return type(e).__name__
+    try:
+        message = json.loads(body).get('message')
+    except ValueError:
+        return 'bad JSON'
+    if message != 'OK':
+        return 'message: ' + str(message)
+    return None
+
+
+def worker(url, mix, stats, stopTime, timeout, rate, responseCache):
+    """
+    Send requests until stopTime. If rate is given, this worker
+    sends at most that many requests per second.
+    """
+    nextTime = time.perf_counter()
+    while time.perf_counter() < stopTime:
+        if rate is not None:
+            delay = nextTime - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            nextTime += 1 / rate
+        lang, mode, text = mix.next()
+        start = time.perf_counter()
+        error = send_request(url, lang, mode, text, timeout, responseCache)
+        stats.add(time.perf_counter() - start, error)
+
+
+def wait_for_server(url, timeout):
+    stopTime = time.perf_counter() + timeout
+    while time.perf_counter() < stopTime:
+        try:
+            with urllib.request.urlopen(url, timeout=5):
+                return True
+        except urllib.error.HTTPError:
+            return True
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    return False
+
+
+def print_interval(summary):
+    line = '%6.0fs %7d req %8.1f req/s %6.1f%% errors' % (summary['start'], summary['requests'],
+                                                         summary['throughput'], summary['error_rate'] * 100)
+    if 'p50_ms' in summary:
+        line += '   p50 %8.1f ms   p90 %8.1f ms   p99 %8.1f ms' % (summary['p50_ms'], summary['p90_ms'],
+                                                                   summary['p99_ms'])
+    print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the uniparser web interface.')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='address of the tested instance')
+    parser.add_argument('--langs', nargs='+', default=['beserman'], help='languages with weights (lang:weight)')
+    parser.add_argument('--modes', nargs='+', default=['sentence:9', 'paper:1'],
+                        help='modes with weights (sentence:weight, paper:weight)')
+    parser.add_argument('--lengths', nargs='+', default=['short:4', 'long:1'],
+                        help='sentence lengths with weights (short:weight, long:weight)')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of simultaneous clients')
+    parser.add_argument('--duration', type=float, default=60, help='length of the test in seconds')
+    parser.add_argument('--rate', type=float, help='maximum requests per second for each client')
+    parser.add_argument('--interval', type=float, default=5, help='reporting interval in seconds')
+    parser.add_argument('--timeout', type=float, default=120, help='timeout of one request in seconds')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the request mix')
+    parser.add_argument('--response-cache', action='store_true',
+                        help='let the server use its response and paper-mode segment caches')
+    parser.add_argument('--server', help='command that starts the server to test')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    mix = RequestMix(parse_weights(args.langs), parse_weights(args.modes),
+                     parse_weights(args.lengths), args.seed)
+    server = None
+    if args.server is not None:
+        server = subprocess.Popen(shlex.split(args.server),
+                                  cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        if not wait_for_server(args.url, 300):
+            print('The server at ' + args.url + ' does not respond.', file=sys.stderr)
+            sys.exit(1)
+        stats = Stats(args.interval)
+        stopTime = stats.start + args.duration
+        threads = [threading.Thread(target=worker, daemon=True,
+                                    args=(args.url, mix, stats, stopTime, args.timeout, args.rate,
+                                          args.response_cache))
+                   for i in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        nReported = 0
+        while any(t.is_alive() for t in threads):
+            time.sleep(0.2)
+            report = stats.report(time.perf_counter() - stats.start)
+            # Intervals that have ended
+            finished = [s for s in report['intervals']
+                        if s['start'] + args.interval <= time.perf_counter() - stats.start]
+            for summary in finished[nReported:]:
+                print_interval(summary)
+            nReported = max(nReported, len(finished))
+        duration = time.perf_counter() - stats.start
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = stats.report(duration)
+    for summary in report['intervals'][nReported:]:
+        print_interval(summary)
+    report['settings'] = {
+        'url': args.url,
+        'langs': parse_weights(args.langs),
+        'modes': parse_weights(args.modes),
+        'lengths': parse_weights(args.lengths),
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'rate': args.rate,
+        'seed': args.seed,
+        'response_cache': args.response_cache,
+        'server': args.server
+    }
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as fOut:
+            json.dump(report, fOut, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmarks for the sentence and paper-mode pipelines.
+
+Each language is benchmarked on the fixed corpus in benchmarks/corpora/<lang>.txt
+(one short sentence per line). Long inputs are made by joining these sentences
+up to the 2048-character limit of the web interface. Paper mode is benchmarked
+on benchmarks/corpora/<lang>_paper.txt for the languages that support it.
+For each stage, the throughput, the mean, p50 and p99 latency and the peak
+memory allocated by Python (measured with tracemalloc in a separate run)
+are reported in JSON, so that runs can be compared with --compare.
+
+Usage:
+    python benchmarks/run_benchmarks.py --langs beserman udmurt --output new.json
+    python benchmarks/run_benchmarks.py --output new.json --compare old.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import tracemalloc
+import importlib.metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from web_app.settings import load_settings
+from web_app.analyzer import Analyzer, PaperParser
+from corpus import read_corpus, read_paper, read_query_log, long_inputs
+
+CASES = ['sentence_short', 'sentence_long', 'translit', 'render', 'paper_html', 'paper_docx']
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def measure(f, items, repeat, memory=True):
+    """
+    Call f on each of the items repeat times and return
+    the statistics of the calls.
+    """
+    f(items[0])     # Warm-up
+    latencies = []
+    start = time.perf_counter()
+    for i in range(repeat):
+        for item in items:
+            callStart = time.perf_counter()
+            f(item)
+            latencies.append(time.perf_counter() - callStart)
+    total = time.perf_counter() - start
+    result = {
+        'calls': len(latencies),
+        'throughput': len(latencies) / total,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+    if memory:
+        tracemalloc.start()
+        for item in items:
+            f(item)
+        result['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def benchmark_language(a, pp, lang, sentences, cases, repeat, memory):
+    results = {}
+    if len(sentences) > 0:
+        if 'sentence_short' in cases:
+            results['sentence_short'] = measure(lambda s: a.analyze(lang, s), sentences, repeat, memory)
+        if 'sentence_long' in cases:
+            results['sentence_long'] = measure(lambda s: a.analyze(lang, s),
+                                               long_inputs(sentences, 4), repeat, memory)
+        analyses = [a.analyze(lang, s) for s in sentences]
+        if 'translit' in cases and 'translit' in a.langs[lang]:
+            def translit(analysis):
+                # Measure transliteration itself, not the cache
+                for f in a.langs[lang]['translit'].values():
+                    f.clear()
+                return a.transliterate(lang, analysis['default'])
+            results['translit'] = measure(translit, analyses, repeat, memory)
+        if 'render' in cases:
+            def render(analysis):
+                # Measure rendering itself, not the cell cache
+                pp.renderer.cellCache.clear()
+                return pp.renderer.render_analysis(analysis)
+            results['render'] = measure(render, analyses, repeat, memory)
+    paper = read_paper(lang)
+    if paper is not None and lang in PaperParser.rxWordLang:
+        # Measure the processing of a new text, not the segment cache
+        def paper_html(text):
+            pp.segmentCache.clear()
+            return pp.analyze(lang, text)
+
+        def paper_docx(text):
+            pp.segmentCache.clear()
+            return pp.build_docx(lang, text)
+
+        if 'paper_html' in cases:
+            results['paper_html'] = measure(paper_html, [paper], repeat, memory)
+        if 'paper_docx' in cases:
+            results['paper_docx'] = measure(paper_docx, [paper], repeat, memory)
+    return results
+
+
+def package_versions(a):
+    versions = {}
+    for package in ['uniparser-morph', 'flask', 'python-docx'] + [a.langs[lang]['module'] for lang in a.langs]:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def compare(old, new):
+    """
+    Print the change of throughput and p50 latency
+    for every language and case present in both runs.
+    """
+    print('%-20s %-16s %12s %12s' % ('language', 'case', 'throughput', 'p50'))
+    for lang in new['results']:
+        for case, stats in new['results'][lang].items():
+            try:
+                oldStats = old['results'][lang][case]
+            except KeyError:
+                continue
+            print('%-20s %-16s %+11.1f%% %+11.1f%%' % (
+                lang, case,
+                (stats['throughput'] / oldStats['throughput'] - 1) * 100,
+                (stats['p50_ms'] / oldStats['p50_ms'] - 1) * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the analysis and paper-mode pipelines.')
+    parser.add_argument('--langs', nargs='*', help='languages to benchmark (default: all enabled ones)')
+    parser.add_argument('--cases', nargs='*', choices=CASES, default=CASES)
+    parser.add_argument('--repeat', type=int, default=5, help='how many times to go through each corpus')
+    parser.add_argument('--token-cache', action='store_true',
+                        help='use the token cache (by default, every token is analyzed)')
+    parser.add_argument('--analysis-store', action='store_true',
+                        help='use the persistent analysis store if the settings enable it')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak memory')
+    parser.add_argument('--query-log', help='take the sentences from this query log instead of the corpora')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results with a previous JSON file')
+    args = parser.parse_args()
+
+    settings = load_settings()
+    settings['preload_languages'] = []
+    settings['pool_workers'] = 0
+    if not args.token_cache:
+        settings['token_cache_size'] = 0
+    if not args.analysis_store:
+        settings['analysis_store'] = False
+    langs = args.langs or settings['languages']
+    settings['languages'] = langs
+    a = Analyzer(settings)
+    pp = PaperParser(a)
+    logSentences = read_query_log(args.query_log) if args.query_log is not None else None
+
+    run = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'packages': package_versions(a),
+            'repeat': args.repeat,
+            'token_cache': args.token_cache,
+            'analysis_store': settings['analysis_store'],
+            'query_log': args.query_log,
+            'load_seconds': {}
+        },
+        'results': {}
+    }
+    for lang in langs:
+        start = time.perf_counter()
+        a.get_analyzer(lang)
+        sentences = logSentences.get(lang, []) if logSentences is not None else read_corpus(lang)
+        run['meta']['load_seconds'][lang] = time.perf_counter() - start
+        # Keep anything the analyzers print out of the JSON output
+        with contextlib.redirect_stdout(sys.stderr):
+            run['results'][lang] = benchmark_language(a, pp, lang, sentences,
+                                                      args.cases, args.repeat, not args.no_memory)
+        print(lang, 'done', file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as fOut:
+            json.dump(run, fOut, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(run, ensure_ascii=False, indent=2))
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf-8') as fIn:
+            compare(json.load(fIn), run)
+
+
+if __name__ == '__main__':
+    main()
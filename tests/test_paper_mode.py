@@ -0,0 +1,31 @@
+"""
+A paper-mode request with one glossed example is sent to /<lang>/analyze
+for every enabled language. The example is the first sentence of the
+language's corpus in benchmarks/corpora. Loading all the grammars takes
+a few minutes.
+"""
+
+import os
+import pytest
+from web_app import app, a
+
+CORPORA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'benchmarks', 'corpora')
+
+
+def first_sentence(lang):
+    with open(os.path.join(CORPORA_DIR, lang + '.txt'), 'r', encoding='utf-8') as fIn:
+        for line in fIn:
+            if len(line.strip()) > 0:
+                return line.strip()
+
+
+@pytest.mark.parametrize('lang', sorted(a.langs))
+def test_paper_request(lang):
+    text = 'Text.\n(x1) ' + first_sentence(lang) + '\n‘Translation.’\n'
+    response = app.test_client().post('/' + lang + '/analyze', data={'mode': 'paper', 'sentence': text},
+                                      headers={'Cache-Control': 'no-cache'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['message'] == 'OK'
+    assert '(x1)' in data['analysis']
@@ -0,0 +1,117 @@
+"""
+The regexes built from the lists in web_app/data must match exactly what
+the plain alternation of the same lists matches, and gloss_runs() must
+split glosses the way it did before it was rewritten as a single pass.
+The texts are random sequences of the literal beginnings of the listed
+alternatives, words that match the other alternatives, their mutations
+and separators, generated with a fixed seed.
+"""
+
+import re
+import random
+import pytest
+from web_app.analyzer import PaperParser
+from web_app.regex_lists import read_alternatives, literal_prefix, alternatives_regex, word_list_regex
+
+N_TEXTS = 20000
+
+# Words that match alternatives which do not begin with literal characters
+# or have optional and variable parts
+EXTRA_TOKENS = {
+    'glosses_beserman.txt': [
+        '1SG', '2PL', '3sg', 'ACC.3SG', 'ACC.1PL.POSS', 'PST.EVID', 'PST.EVID.NEG.3SG',
+        'PST.EVID.NEG.12PL', 'NEG.FUT.3PL', 'NEG.1.SG', 'CNG.PST.1SG', 'OPT.2', 'INF.CESS',
+        'PTCP.ACT', 'PTCP.PST.NEG', 'CVB.SIM2', 'CVB.REAS.NEG', 'PL.ADJ', 'IMP.MTG',
+        'GEN2', 'ACC.PL', 'CAR', 'ADD', 'ID', 'ID=', 'ADVLOC', 'ADVTEMP'
+    ],
+    'words_beserman.txt': [
+        'mon', 'ton', 'maren', 'taos', 'soos', 'taoslen', 'taje', 'og-og', 'og-ogez', 'kudiz',
+        'pervoj', 'pervij', 'pun', 'punem', 'puno', 'vue', 'vuid', 'mestajez', 'pume', 'seregez',
+        'gorode', 'azbare', 'azbaram', 'pala', 'anaj', 'atajjed', 'ule', 'punnam', 'kolxoze',
+        'kokojed', 'suganjez', 'kureg', 'skalje', 'vajo', 'abilen', 'murtjos', 'murtjoslen',
+        'gurtjez', 'korkaez', 'potiz', 'odigez', 'sre', 'taizlen', 'soin', 'tatek', 'ez', 'ug'
+    ]
+}
+SEPARATORS = [' ', ' ', ' ', '-', '.', '=', '(', ')', '‘', "'", '$', '\n', '\r\n', ',']
+FLAGS = {
+    'glosses_beserman.txt': re.DOTALL | re.I,
+    'words_beserman.txt': re.DOTALL
+}
+
+
+def literal_beginning(alternative):
+    return ''.join(c for c, regex in literal_prefix(alternative)[0])
+
+
+def random_texts(fname, seed):
+    rnd = random.Random(seed)
+    tokens = [literal_beginning(alt) for alt in read_alternatives(fname)]
+    tokens = [t for t in tokens if len(t) > 0] + EXTRA_TOKENS[fname]
+    alphabet = sorted(set(''.join(tokens)) | set('aeiouxyz'))
+    texts = []
+    for i in range(N_TEXTS):
+        parts = []
+        for j in range(rnd.randint(1, 6)):
+            token = rnd.choice(tokens)
+            if rnd.random() < 0.3:
+                token = token.lower() if rnd.random() < 0.5 else token.upper()
+            if rnd.random() < 0.3:
+                iChar = rnd.randint(0, len(token))
+                token = token[:iChar] + rnd.choice(alphabet) + token[iChar + 1:]
+            parts.append(token)
+            parts.append(rnd.choice(SEPARATORS))
+        texts.append(''.join(parts[:-1]))
+    return texts
+
+
+def matches(rx, text):
+    # Groups inside the alternatives may be numbered differently
+    return [(m.span(), m.group(1)) for m in rx.finditer(text)]
+
+
+@pytest.mark.parametrize('fname', sorted(FLAGS))
+def test_word_list_regex(fname):
+    ignoreCase = (FLAGS[fname] & re.I) != 0
+    rxPlain = re.compile('\\b(' + '|'.join(read_alternatives(fname)) + ')\\b', flags=FLAGS[fname])
+    rxTrie = re.compile(word_list_regex(fname, ignoreCase=ignoreCase), flags=FLAGS[fname])
+    differences = [text for text in random_texts(fname, 25) if matches(rxPlain, text) != matches(rxTrie, text)]
+    assert differences == []
+
+
+@pytest.mark.parametrize('alternatives, text', [
+    (['a', 'ab'], 'ab'),
+    (['ab', 'a'], 'ab'),
+    (['ab', '.', 'ac'], 'ac'),
+    (['a\\.b', 'a\\.c', 'a.d'], 'a.c a-d'),
+    (['(?<=-)ab', 'ac'], '-ab ab ac'),
+    (['ab?', 'abc'], 'abc'),
+    (['x\\w+', 'xy'], 'xyz'),
+])
+def test_alternatives_order(alternatives, text):
+    rxPlain = re.compile('|'.join(alternatives))
+    rxTrie = re.compile(alternatives_regex(alternatives))
+    assert rxPlain.findall(text) == rxTrie.findall(text)
+
+
+def old_gloss_runs(text, lang):
+    """
+    gloss_runs() as it was before it was rewritten as a single finditer pass:
+    glosses were marked with dollar signs and the text was split by them.
+    """
+    if lang not in PaperParser.rxGlosses:
+        return [(text, False)]
+    runs = []
+    text = PaperParser.rxGlosses[lang].sub(lambda m: '$' + m.group(1).lower() + '$', text)
+    for run in re.findall('([^$]+)', text):
+        runs.append((run, PaperParser.rxGlosses[lang].search(run) is not None))
+    return runs
+
+
+def test_gloss_runs():
+    differences = [text for text in random_texts('glosses_beserman.txt', 26)
+                   if PaperParser.gloss_runs(text, 'beserman') != old_gloss_runs(text, 'beserman')]
+    assert differences == []
+
+
+def test_gloss_runs_other_languages():
+    assert PaperParser.gloss_runs('go-PST', 'udmurt') == [('go-PST', False)]
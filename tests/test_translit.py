@@ -0,0 +1,46 @@
+"""
+The transliterations are checked against frozen input/output pairs in
+data/translit_cases.json. The outputs were produced by the transliteration
+functions as they were before their rules were compiled by translit_engine
+(corpus sentences and words from benchmarks/corpora and random strings over
+the alphabets of the rules), so any change in the output of a rule list
+shows up here.
+"""
+
+import os
+import json
+import pytest
+from web_app.translit_armenian import armenian_translit_meillet, armenian_input_latin
+from web_app.translit_beserman import beserman_translit_cyrillic, beserman_translit_ipa, beserman_translit_upa
+from web_app.translit_erzya import erzya_translit_upa
+from web_app.translit_udmurt import udmurt_translit_upa
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'translit_cases.json'),
+          'r', encoding='utf-8') as fIn:
+    CASES = json.load(fIn)
+
+TRANSLITERATORS = {
+    'armenian_translit_meillet': armenian_translit_meillet,
+    'armenian_input_latin': lambda text: armenian_input_latin('wf', text),
+    'beserman_translit_cyrillic': beserman_translit_cyrillic,
+    'beserman_translit_ipa': beserman_translit_ipa,
+    'beserman_translit_upa': beserman_translit_upa,
+    'erzya_translit_upa': erzya_translit_upa,
+    'udmurt_translit_upa': udmurt_translit_upa
+}
+
+
+def test_all_transliterators_covered():
+    assert set(CASES) == set(TRANSLITERATORS)
+
+
+@pytest.mark.parametrize('name', sorted(TRANSLITERATORS))
+def test_frozen_outputs(name):
+    translit = TRANSLITERATORS[name]
+    differences = [(text, expected, translit(text)) for text, expected in CASES[name]
+                   if translit(text) != expected]
+    assert differences == []
+
+
+def test_input_latin_other_fields():
+    assert armenian_input_latin('sentence', 'mard') == 'mard'
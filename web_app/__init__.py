@@ -1,28 +1,121 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, Response, stream_with_context, send_file, g
 import copy
-from datetime import datetime
+import io
+import os
+import time
+import hashlib
 import json
 from .analyzer import Analyzer, PaperParser
+from .process_pool import PoolBusyError
+from .jobs import JobQueue
+from .lru_cache import LRUCache
+from .records import records_to_json
+from .rendering import Renderer
+from .response_cache import make_response_cache, response_cache_key, body_etag, normalize_text
+from .query_log import QueryLogger
+from .metrics import REGISTRY, REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, Counter, Gauge
+from .profiling import RequestProfiler
+from .warmup import Warmup
 
 app = Flask(__name__)
 
 a = Analyzer()
-pp = PaperParser(a)
+renderer = Renderer(a.settings['render_cache_size'])
+pp = PaperParser(a, renderer)
+jobs = JobQueue(pp, nWorkers=a.settings['job_workers'], maxKept=a.settings['jobs_max_kept'],
+               maxPending=a.settings['jobs_max_pending'])
+# Paper-mode texts whose DOCX can still be downloaded, by document ID
+docxTexts = LRUCache(a.settings['docx_texts_kept'])
+# Word documents that have already been built, by document ID
+docxFiles = LRUCache(a.settings['docx_files_kept'])
+queryLogger = QueryLogger(a.settings['query_log_file'],
+                          sampleRate=a.settings['query_log_sample_rate'],
+                          flushSize=a.settings['query_log_flush_size'],
+                          flushInterval=a.settings['query_log_flush_interval'],
+                          maxBytes=a.settings['query_log_max_bytes'],
+                          backupCount=a.settings['query_log_backups'])
+responseCache = make_response_cache(a.settings)
+warmup = Warmup(a, a.settings)
+warmup.start()
+profiler = RequestProfiler(enabled=a.settings['profiling_enabled'],
+                           profileDir=a.settings['profile_dir'],
+                           maxKept=a.settings['profiles_kept'])
+# Analyzer.tokenize() keeps 2048 characters of a sentence, at most 4 bytes each
+MAX_LINE_BYTES = 2048 * 4
+
+
+def cache_metric_values(counter):
+    """
+    Return the value of one of the counters from Analyzer.cache_stats()
+    for each cache, labeled for the metrics endpoint.
+    """
+    stats = a.cache_stats()
+    values = {}
+    for lang, langStats in stats['tokens'].items():
+        values[(('cache', 'tokens'), ('lang', lang))] = langStats[counter]
+    for lang, translits in stats['translit'].items():
+        for translit, translitStats in translits.items():
+            values[(('cache', 'translit_' + translit), ('lang', lang))] = translitStats[counter]
+    for lang, langStats in stats['store'].items():
+        values[(('cache', 'store'), ('lang', lang))] = langStats[counter]
+    values[(('cache', 'render'), ('lang', 'none'))] = renderer.stats()[counter]
+    values[(('cache', 'docx'), ('lang', 'none'))] = docxFiles.stats()[counter]
+    values[(('cache', 'paper_segments'), ('lang', 'none'))] = pp.segmentCache.stats()[counter]
+    if responseCache is not None:
+        values[(('cache', 'response'), ('lang', 'none'))] = responseCache.stats()[counter]
+    return values
+
+
+Gauge('uniparser_web_cache_size', 'Number of entries in each cache.',
+      callback=lambda: cache_metric_values('size'))
+for counter in ('hits', 'misses', 'evictions'):
+    Counter('uniparser_web_cache_' + counter + '_total', 'Number of cache ' + counter + '.',
+            callback=lambda counter=counter: cache_metric_values(counter))
+
+
+@app.before_request
+def start_timer():
+    g.startTime = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    lang = 'none'
+    if request.view_args is not None and 'lang' in request.view_args:
+        lang = request.view_args['lang'] if request.view_args['lang'] in a.langs else 'unknown'
+    endpoint = request.endpoint or 'none'
+    REQUESTS.inc(endpoint=endpoint, lang=lang, status=response.status_code)
+    if 'startTime' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.startTime, endpoint=endpoint, lang=lang)
+    return response
 
 
 def copy_request_args():
     """
-    Copy the reauest arguments from request.data to a
-    normal modifiable dictionary. Return the dictionary.
+    Copy the reauest arguments from request.data (or from the
+    query string of a GET request) to a normal modifiable
+    dictionary. Return the dictionary.
     """
     query = {}
-    if request.form is None or len(request.form) <= 0:
+    fields = request.form
+    if request.method in ('GET', 'HEAD'):
+        fields = request.args
+    if fields is None or len(fields) <= 0:
         return query
-    for field, value in request.form.items():
+    for field, value in fields.items():
         query[field] = copy.deepcopy(value)
     return query
 
 
+def log_query(lang, query):
+    queryLogger.log(lang, query)
+
+
+@app.errorhandler(PoolBusyError)
+def pool_busy(e):
+    return jsonify({'message': 'The server is busy, please try again later.'}), 503
+
+
 @app.route('/')
 def index():
     return render_template('index.html', languages=a.langs)
@@ -38,23 +131,285 @@ def index_lang(lang):
     return render_template('index.html', languages=a.langs)
 
 
-@app.route('/<lang>/analyze', methods=['POST'])
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+def docx_id(lang, text):
+    """
+    Return the ID under which the DOCX of a paper-mode text can be
+    downloaded. The ID only depends on the text normalized the same
+    way as in the response cache key, so that a cached response contains
+    the ID under which the current request registers its text.
+    """
+    return hashlib.sha256((lang + '\n' + normalize_text(text)).encode('utf-8')).hexdigest()
+
+
+def docx_bytes(lang, text, useCache=True):
+    """
+    Return the Word document of a paper-mode text as bytes. Documents
+    that have already been built are taken from docxFiles, unless
+    useCache is False.
+    """
+    docxId = docx_id(lang, text)
+    docxFile = None
+    if useCache:
+        docxFile = docxFiles.get(docxId)
+    if docxFile is None:
+        docxFile = pp.build_docx(lang, normalize_text(text), useCache=useCache).getvalue()
+        docxFiles.put(docxId, docxFile)
+    return docxFile
+
+
+def analysis_response(lang, query, useCache=True):
+    """
+    Analyze the query sent to /<lang>/analyze and return
+    the response as a dictionary. If useCache is False, paper-mode
+    texts are processed without the segment cache.
+    """
+    if query['mode'] == 'sentence':
+        analysis = a.analyze(lang, query['sentence'])
+        if query.get('format') == 'json':
+            # The table is rendered in the browser. JSON objects are
+            # sent with sorted keys, so the order of transliterations is sent separately.
+            return {'message': 'OK', 'analyses': records_to_json(analysis),
+                    'translits': list(analysis)}
+        with STAGE_SECONDS.time(stage='render', lang=lang):
+            analysisHTML = renderer.render_analysis(analysis)
+        return {'message': 'OK', 'analysis': analysisHTML}
+    else:
+        docxId = docx_id(lang, query['sentence'])
+        if query.get('output') == 'both':
+            # The Word document is made in the same pass and kept for /docx/<docx_id>
+            textHTML, docxFile = pp.build_html_docx(lang, query['sentence'], useCache=useCache)
+            docxFiles.put(docxId, docxFile.getvalue())
+        else:
+            textHTML = pp.analyze(lang, query['sentence'], useCache=useCache)
+        return {'message': 'OK', 'analysis': textHTML, 'docx_id': docxId}
+
+
+def cached_response(etag, body):
+    """
+    Make a JSON response with the given ETag. A GET request whose
+    If-None-Match header contains the ETag gets an empty 304 response
+    instead; for a POST request, such a precondition fails with 412.
+    Only responses to GET requests can be cached by the client.
+    """
+    if not request.if_none_match.contains(etag):
+        response = Response(body, mimetype='application/json')
+    elif request.method in ('GET', 'HEAD'):
+        response = Response(status=304)
+    else:
+        response = Response(status=412)
+    response.set_etag(etag)
+    if request.method in ('GET', 'HEAD'):
+        response.headers['Cache-Control'] = 'private, max-age=' + str(a.settings['response_cache_ttl'])
+    return response
+
+
+@app.route('/<lang>/analyze', methods=['GET', 'POST'])
+@profiler.profile
 def analyze_input(lang):
     if lang not in a.langs:
         return jsonify({'message': 'Wrong language.'})
     query = copy_request_args()
     if 'sentence' not in query or query['sentence'] in (None, ''):
         return jsonify({'message': 'Empty sentence sent.'})
-    with open('query_log.txt', 'a', encoding='utf-8') as fLog:
-        fLog.write(datetime.now().isoformat(timespec='seconds') + '\t' + lang + '\n')
-        fLog.write(json.dumps(query, ensure_ascii=False, indent=2) + '\n\n')
-    if query['mode'] == 'sentence':
-        analysis = a.analyze(lang, query['sentence'])
-        analysisHTML = render_template('analysis.html', words=analysis)
-        return jsonify({'message': 'OK', 'analysis': analysisHTML})
+    if query.get('mode') not in ('sentence', 'paper'):
+        return jsonify({'message': 'Wrong mode.'})
+    if query.get('output', 'html') not in ('html', 'docx', 'both'):
+        return jsonify({'message': 'Wrong output format.'})
+    log_query(lang, query)
+    # Profiled requests are always processed from scratch. Cache-Control: no-cache
+    # asks for a fresh response (the load test sends it): the cached responses,
+    # documents and paper-mode segments are not used then.
+    profiled = profiler.enabled and profiler.requested()
+    fresh = profiled or request.cache_control.no_cache
+    if query['mode'] != 'sentence':
+        if query.get('output') == 'docx':
+            return send_docx(io.BytesIO(docx_bytes(lang, query['sentence'], useCache=not fresh)))
+        docxTexts.put(docx_id(lang, query['sentence']), (lang, normalize_text(query['sentence'])))
+    useCache = responseCache is not None and not profiled
+    key = response_cache_key(lang, query)
+    cached = None
+    if useCache and not fresh:
+        cached = responseCache.get(key)
+    if cached is not None:
+        etag, body = cached
     else:
-        textHTML = pp.analyze(lang, query['sentence'])
-        return jsonify({'message': 'OK', 'analysis': textHTML})
+        body = jsonify(analysis_response(lang, query, useCache=not fresh)).get_data()
+        etag = body_etag(body)
+        if useCache and len(body) <= a.settings['response_cache_max_item_size']:
+            responseCache.put(key, etag, body)
+    return cached_response(etag, body)
+
+
+@app.route('/profiles/<profile_id>')
+def download_profile(profile_id):
+    """
+    Send a saved request profile: the pstats file by default,
+    a text report with ?format=text, or collapsed stacks with
+    ?format=collapsed.
+    """
+    if not profiler.enabled:
+        return jsonify({'message': 'Profiling is switched off.'})
+    fname = profiler.path(profile_id)
+    if fname is None:
+        return jsonify({'message': 'No such profile.'})
+    outputFormat = request.args.get('format', 'pstats')
+    if outputFormat == 'text':
+        return Response(profiler.report(fname, sortBy=request.args.get('sort', 'cumulative')),
+                        mimetype='text/plain')
+    if outputFormat == 'collapsed':
+        return Response(profiler.collapsed(fname), mimetype='text/plain')
+    return send_file(os.path.abspath(fname), as_attachment=True,
+                     download_name=profile_id + '.prof',
+                     mimetype='application/octet-stream')
+
+
+def send_docx(docxFile):
+    return send_file(docxFile, as_attachment=True,
+                     download_name='processed.docx',
+                     mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+
+
+@app.route('/docx/<doc_id>')
+def download_docx(doc_id):
+    """
+    Build the Word document for a text previously glossed in
+    paper mode and send it to the user.
+    """
+    doc = docxTexts.get(doc_id)
+    if doc is None:
+        return jsonify({'message': 'No such document.'})
+    return send_docx(io.BytesIO(docx_bytes(*doc)))
+
+
+@app.route('/<lang>/analyze_batch', methods=['POST'])
+def analyze_batch(lang):
+    """
+    Analyze many sentences at once. The request body is a JSON list
+    of sentences, or a JSON object with such a list under the "sentences"
+    key. Each sentence is either a string or a list of tokens.
+    """
+    if lang not in a.langs:
+        return jsonify({'message': 'Wrong language.'})
+    query = request.get_json(silent=True)
+    translit = True
+    if type(query) == dict:
+        translit = bool(query.get('translit', True))
+        query = query.get('sentences')
+    if (type(query) != list
+            or any(type(s) not in (str, list) for s in query)
+            or any(type(s) == list and any(type(t) != str for t in s) for s in query)):
+        return jsonify({'message': 'A list of sentences or tokenized sentences expected.'})
+    if len(query) > a.settings['batch_max_sentences']:
+        return jsonify({'message': 'Too many sentences in one request.'})
+    analyses = a.analyze_batch(lang, query, translit=translit)
+    return jsonify({'message': 'OK', 'analyses': records_to_json(analyses)})
+
+
+@app.route('/<lang>/jobs', methods=['POST'])
+def submit_job(lang):
+    """
+    Submit a paper-mode document for processing in the background.
+    Return the ID of the job, which can be used to poll its status.
+    """
+    if lang not in a.langs:
+        return jsonify({'message': 'Wrong language.'})
+    query = copy_request_args()
+    if 'sentence' not in query or query['sentence'] in (None, ''):
+        return jsonify({'message': 'Empty text sent.'})
+    log_query(lang, query)
+    job = jobs.submit(lang, query['sentence'])
+    return jsonify({'message': 'OK', 'job_id': job.id})
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': 'No such job.'})
+    result = job.to_dict()
+    result['message'] = 'OK'
+    if job.status == 'failed':
+        result['message'] = 'Processing failed: ' + job.error
+    return jsonify(result)
+
+
+@app.route('/jobs/<job_id>/html')
+def job_html(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': 'No such job.'})
+    if job.status != 'done':
+        return jsonify({'message': 'The job is not finished yet.', 'status': job.status})
+    return jsonify({'message': 'OK', 'analysis': job.html})
+
+
+@app.route('/jobs/<job_id>/docx')
+def job_docx(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': 'No such job.'})
+    if job.status != 'done':
+        return jsonify({'message': 'The job is not finished yet.', 'status': job.status})
+    return send_docx(io.BytesIO(jobs.get_docx(job)))
+
+
+def read_lines(stream):
+    """
+    Iterate over the lines of a binary input stream without
+    reading all of it into memory. Only the first MAX_LINE_BYTES bytes
+    of a line are kept (the analyzer truncates sentences anyway),
+    the rest of it is skipped.
+    """
+    while True:
+        line = stream.readline(MAX_LINE_BYTES)
+        if len(line) <= 0:
+            return
+        if not line.endswith(b'\n'):
+            rest = line
+            while len(rest) > 0 and not rest.endswith(b'\n'):
+                rest = stream.readline(MAX_LINE_BYTES)
+        yield line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+
+def stream_analyses(lang, lines, translit):
+    """
+    Analyze the lines in chunks and yield one NDJSON record per line.
+    """
+    chunkSize = a.settings['stream_chunk_size']
+    chunk = []
+    nLine = 0
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunkSize:
+            for analyses in a.analyze_batch(lang, chunk, translit=translit):
+                yield json.dumps({'line': nLine, 'analyses': records_to_json(analyses)},
+                                 ensure_ascii=False) + '\n'
+                nLine += 1
+            chunk = []
+    if len(chunk) > 0:
+        for analyses in a.analyze_batch(lang, chunk, translit=translit):
+            yield json.dumps({'line': nLine, 'analyses': records_to_json(analyses)},
+                             ensure_ascii=False) + '\n'
+            nLine += 1
+
+
+@app.route('/<lang>/analyze_stream', methods=['POST'])
+def analyze_stream(lang):
+    """
+    Analyze a text sent as the request body, one sentence per line.
+    The response is streamed as NDJSON, one record per input line,
+    while the rest of the input is still being read.
+    """
+    if lang not in a.langs:
+        return jsonify({'message': 'Wrong language.'})
+    translit = request.args.get('translit', 'true') != 'false'
+    return Response(stream_with_context(stream_analyses(lang, read_lines(request.stream), translit)),
+                    mimetype='application/x-ndjson')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+import importlib.metadata
+from .records import Analysis, records_to_json
+from .sqlite_connections import SqliteConnections
+
+
+def analyzer_version(module):
+    """
+    Return a string identifying the installed versions of the
+    uniparser_* package and of uniparser-morph.
+    """
+    versions = []
+    for package in (module, 'uniparser-morph'):
+        try:
+            versions.append(importlib.metadata.version(package))
+        except importlib.metadata.PackageNotFoundError:
+            versions.append('unknown')
+    return '-'.join(versions)
+
+
+class LanguageStore:
+    """
+    Analyses of tokens of one language, stored in an SQLite database
+    as JSON, so that they survive restarts and are shared by all worker
+    processes. Errors of the database are treated as missing analyses.
+    """
+    chunkSize = 500     # Number of tokens in one SELECT
+
+    def __init__(self, fname):
+        self.connections = SqliteConnections(fname)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connections.get().execute('CREATE TABLE IF NOT EXISTS analyses '
+                                       '(token TEXT PRIMARY KEY, analyses TEXT)')
+
+    def get_many(self, tokens):
+        """
+        Return a dictionary {token: tuple of analyses}
+        for the tokens that are in the store.
+        """
+        result = {}
+        try:
+            conn = self.connections.get()
+            for iStart in range(0, len(tokens), self.chunkSize):
+                chunk = tokens[iStart:iStart + self.chunkSize]
+                for token, analyses in conn.execute('SELECT token, analyses FROM analyses WHERE token IN ('
+                                                    + ','.join('?' * len(chunk)) + ')', chunk):
+                    result[token] = tuple(Analysis.from_json(ana) for ana in json.loads(analyses))
+        except sqlite3.Error:
+            pass
+        with self.lock:
+            self.hits += len(result)
+            self.misses += len(tokens) - len(result)
+        return result
+
+    def put_many(self, analyses):
+        """
+        Store the analyses given as a dictionary {token: tuple of analyses}.
+        """
+        rows = [(token, json.dumps(records_to_json(w), ensure_ascii=False)) for token, w in analyses.items()]
+        try:
+            conn = self.connections.get()
+        except sqlite3.Error:
+            return
+        try:
+            conn.execute('BEGIN')
+            conn.executemany('INSERT OR REPLACE INTO analyses (token, analyses) VALUES (?, ?)', rows)
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+
+    def __len__(self):
+        try:
+            return self.connections.get().execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'max_size': 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': 0
+        }
+
+
+class AnalysisStore:
+    """
+    Persistent token analysis stores for all languages. Each language has
+    its own file named after the language and the analyzer version, so
+    a store is not used after the uniparser_* package has been updated.
+    Files left from other versions are deleted.
+    """
+
+    def __init__(self, directory, langs):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.stores = {}
+        for lang in langs:
+            fname = lang + '-' + analyzer_version(langs[lang]['module']) + '.sqlite'
+            self.remove_old(lang, fname)
+            self.stores[lang] = LanguageStore(os.path.join(directory, fname))
+
+    def remove_old(self, lang, currentFname):
+        rxFname = re.compile('^' + re.escape(lang) + '-[^-]+-[^-]+\\.sqlite(?:-wal|-shm)?$')
+        for fname in os.listdir(self.directory):
+            if rxFname.search(fname) is not None and not fname.startswith(currentFname):
+                try:
+                    os.remove(os.path.join(self.directory, fname))
+                except OSError:
+                    pass
+
+    def get_many(self, lang, tokens):
+        return self.stores[lang].get_many(tokens)
+
+    def put_many(self, lang, analyses):
+        self.stores[lang].put_many(analyses)
+
+    def stats(self):
+        return {lang: store.stats() for lang, store in self.stores.items()}
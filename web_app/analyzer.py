@@ -1,133 +1,300 @@
 import re
-import os
+import io
 import copy
-import math
-import jinja2
-from flask import render_template
+import hashlib
+import time
+import importlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from docx import Document
 from docx.shared import Inches, Cm, Pt
 from docx.oxml.shared import OxmlElement, qn
 from docx.enum.style import WD_STYLE_TYPE
+from lxml import etree
 
-from uniparser_albanian import AlbanianAnalyzer
-from uniparser_beserman_lat import BesermanLatAnalyzer
-from uniparser_buryat import BuryatAnalyzer
-from uniparser_eastern_armenian import EasternArmenianAnalyzer
-from uniparser_erzya import ErzyaAnalyzer
-from uniparser_komi_zyrian import KomiZyrianAnalyzer
-from uniparser_meadow_mari import MeadowMariAnalyzer
-from uniparser_moksha import MokshaAnalyzer
-from uniparser_ossetic import OsseticAnalyzer
-from uniparser_turoyo import TuroyoAnalyzer
-from uniparser_udmurt import UdmurtAnalyzer
-from uniparser_urmi import UrmiAnalyzer
-
+from .settings import load_settings
+from .lru_cache import LRUCache, MemoizedFunction
+from .process_pool import AnalysisPool
+from .records import words_to_records
+from .analysis_store import AnalysisStore
+from .rendering import Renderer
+from .regex_lists import word_list_regex
+from .docx_tables import DocxTableBuilder
+from .metrics import STAGE_SECONDS, TOKENS, ANALYZER_LOAD_SECONDS
 from .translit_armenian import armenian_translit_meillet
 from .translit_beserman import beserman_translit_cyrillic, beserman_translit_upa, beserman_translit_ipa
 from .translit_erzya import erzya_translit_upa
 from .translit_udmurt import udmurt_translit_upa
 
 
+# All languages the web interface knows about. The uniparser_* package
+# is only imported and its grammar loaded when the language is first needed.
+LANGUAGES = {
+    'albanian': {
+        'name': 'Albanian',
+        'module': 'uniparser_albanian',
+        'class': 'AlbanianAnalyzer'
+    },
+    'beserman': {
+        'name': 'Beserman (Latin-based)',
+        'module': 'uniparser_beserman_lat',
+        'class': 'BesermanLatAnalyzer',
+        'translit': {
+            'UPA': beserman_translit_upa,
+            'IPA': beserman_translit_ipa,
+            'Cyrillic': beserman_translit_cyrillic
+        }
+    },
+    'buryat': {
+        'name': 'Buryat',
+        'module': 'uniparser_buryat',
+        'class': 'BuryatAnalyzer'
+    },
+    'eastern_armenian': {
+        'name': 'Eastern Armenian',
+        'module': 'uniparser_eastern_armenian',
+        'class': 'EasternArmenianAnalyzer',
+        'translit': {
+            'Quasi-Meillet': armenian_translit_meillet
+        }
+    },
+    'erzya': {
+        'name': 'Erzya',
+        'module': 'uniparser_erzya',
+        'class': 'ErzyaAnalyzer',
+        'translit': {
+            'UPA': erzya_translit_upa
+        }
+    },
+    'komi_zyrian': {
+        'name': 'Komi Zyrian',
+        'module': 'uniparser_komi_zyrian',
+        'class': 'KomiZyrianAnalyzer'
+    },
+    'meadow_mari': {
+        'name': 'Meadow Mari',
+        'module': 'uniparser_meadow_mari',
+        'class': 'MeadowMariAnalyzer'
+    },
+    'moksha': {
+        'name': 'Moksha',
+        'module': 'uniparser_moksha',
+        'class': 'MokshaAnalyzer'
+    },
+    'ossetic': {
+        'name': 'Ossetic (Iron)',
+        'module': 'uniparser_ossetic',
+        'class': 'OsseticAnalyzer'
+    },
+    'turoyo': {
+        'name': 'Ṭuroyo',
+        'module': 'uniparser_turoyo',
+        'class': 'TuroyoAnalyzer'
+    },
+    'udmurt': {
+        'name': 'Udmurt',
+        'module': 'uniparser_udmurt',
+        'class': 'UdmurtAnalyzer',
+        'translit': {
+            'UPA': udmurt_translit_upa
+        }
+    },
+    'urmi': {
+        'name': 'Christian Urmi (Assyrian Neo-Aramaic), Latin-based',
+        'module': 'uniparser_urmi',
+        'class': 'UrmiAnalyzer'
+    }
+}
+
+
 class Analyzer:
     rxWords = re.compile('\\w+|\\w[\\w\'-]+\\w|[^\\w]+')
     rxWord = re.compile('\\w+|\\w[\\w\'-]+\\w')
     rxSpace = re.compile('^[ \r\n\t]+$')
     rxBadChars = re.compile('[<>&]')
 
-    def __init__(self):
-        self.langs = {
-            # 'albanian': {
-            #     'name': 'Albanian',
-            #     'analyzer': AlbanianAnalyzer()
-            # },
-            'beserman': {
-                'name': 'Beserman (Latin-based)',
-                'analyzer': BesermanLatAnalyzer(),
-                'translit': {
-                    'UPA': beserman_translit_upa,
-                    'IPA': beserman_translit_ipa,
-                    'Cyrillic': beserman_translit_cyrillic
+    def __init__(self, settings=None):
+        if settings is None:
+            settings = load_settings()
+        self.settings = settings
+        self.langs = {}
+        for lang in self.settings['languages']:
+            if lang not in LANGUAGES:
+                raise ValueError('Unknown language in settings: ' + lang)
+            self.langs[lang] = copy.copy(LANGUAGES[lang])
+            if 'translit' in self.langs[lang]:
+                self.langs[lang]['translit'] = {
+                    translit: MemoizedFunction(f, self.settings['translit_cache_size'])
+                    for translit, f in self.langs[lang]['translit'].items()
                 }
-            }
-            # 'buryat': {
-            #     'name': 'Buryat',
-            #     'analyzer': BuryatAnalyzer()
-            # },
-            # 'eastern_armenian': {
-            #     'name': 'Eastern Armenian',
-            #     'analyzer': EasternArmenianAnalyzer(),
-            #     'translit': {
-            #         'Quasi-Meillet': armenian_translit_meillet
-            #     }
-            # },
-            # 'erzya': {
-            #     'name': 'Erzya',
-            #     'analyzer': ErzyaAnalyzer(),
-            #     'translit': {
-            #         'UPA': erzya_translit_upa
-            #     }
-            # },
-            # 'komi_zyrian': {
-            #     'name': 'Komi Zyrian',
-            #     'analyzer': KomiZyrianAnalyzer()
-            # },
-            # 'meadow_mari': {
-            #     'name': 'Meadow Mari',
-            #     'analyzer': MeadowMariAnalyzer()
-            # },
-            # 'moksha': {
-            #     'name': 'Moksha',
-            #     'analyzer': MokshaAnalyzer()
-            # },
-            # 'ossetic': {
-            #     'name': 'Ossetic (Iron)',
-            #     'analyzer': OsseticAnalyzer()
-            # },
-            # 'turoyo': {
-            #     'name': 'Ṭuroyo',
-            #     'analyzer': TuroyoAnalyzer()
-            # },
-            # 'udmurt': {
-            #     'name': 'Udmurt',
-            #     'analyzer': UdmurtAnalyzer(),
-            #     'translit': {
-            #         'UPA': udmurt_translit_upa
-            #     }
-            # },
-            # 'urmi': {
-            #     'name': 'Christian Urmi (Assyrian Neo-Aramaic), Latin-based',
-            #     'analyzer': UrmiAnalyzer()
-            # }
-        }
+        self.analyzers = {}     # lang -> loaded uniparser analyzer
+        self.loadLock = threading.Lock()
         self.disamb_langs = ['albanian', 'udmurt', 'beserman', 'eastern_armenian']
+        # Per-language caches of token analyses. Disambiguation depends
+        # on the context, so only non-disambiguated analyses are cached.
+        self.tokenCaches = {lang: LRUCache(self.settings['token_cache_size'])
+                            for lang in self.langs}
+        # Persistent token analyses shared by all processes, also
+        # only for languages without disambiguation
+        self.store = None
+        if self.settings['analysis_store']:
+            self.store = AnalysisStore(self.settings['analysis_store_dir'],
+                                       {lang: self.langs[lang] for lang in self.langs
+                                        if lang not in self.disamb_langs})
+        for lang in self.settings['preload_languages']:
+            if lang in self.langs:
+                self.get_analyzer(lang)
+        self.pool = None
+        if self.settings['pool_workers'] > 0:
+            self.pool = AnalysisPool(self, self.settings['pool_workers'],
+                                     self.settings['pool_max_queue'],
+                                     self.settings['pool_timeout'])
 
-    def analyze(self, lang, sentence):
-        if lang not in self.langs:
-            return ''
+    def get_analyzer(self, lang):
+        """
+        Return the uniparser analyzer for the language, importing
+        its package and loading the grammar on first use.
+        """
+        try:
+            return self.analyzers[lang]
+        except KeyError:
+            pass
+        with self.loadLock:
+            # Another thread could have loaded it while we were waiting
+            if lang not in self.analyzers:
+                start = time.perf_counter()
+                module = importlib.import_module(self.langs[lang]['module'])
+                self.analyzers[lang] = getattr(module, self.langs[lang]['class'])()
+                ANALYZER_LOAD_SECONDS.set(time.perf_counter() - start, lang=lang)
+            return self.analyzers[lang]
+
+    def analyze_words(self, lang, words, **kwargs):
+        """
+        Call analyze_words() of the language's analyzer, in the process
+        pool if there is one.
+        """
+        stage = 'analyze'
+        if kwargs.get('disambiguate', False):
+            stage = 'analyze_disamb'
+        with STAGE_SECONDS.time(stage=stage, lang=lang):
+            if self.pool is not None:
+                return self.pool.analyze_words(lang, words, **kwargs)
+            return self.get_analyzer(lang).analyze_words(words, **kwargs)
+
+    def tokenize(self, sentence):
+        """
+        Clean the sentence and split it into tokens.
+        """
         sentence = self.rxBadChars.sub('', sentence)[:2048]
-        tokens = [t.strip() for t in self.rxWords.findall(sentence.strip())
-                  if self.rxSpace.search(t) is None]
-        result = []
+        return [t.strip() for t in self.rxWords.findall(sentence.strip())
+                if self.rxSpace.search(t) is None]
+
+    def analyze_tokens(self, lang, tokens):
+        """
+        Analyze a list of tokens and return a list of tuples of
+        analyses (Analysis objects). For languages without disambiguation,
+        look the tokens up in the token cache and then in the persistent
+        store, if there is one, before analyzing them.
+        """
+        TOKENS.inc(len(tokens), lang=lang)
         if lang in self.disamb_langs:
-            result = self.langs[lang]['analyzer'].analyze_words(tokens, disambiguate=True, format='json')
-        else:
-            result = self.langs[lang]['analyzer'].analyze_words(tokens, format='json')
-        result = {'default': result}
-        if 'translit' in self.langs[lang]:
+            return words_to_records(self.analyze_words(lang, tokens, disambiguate=True, format='json'))
+        cache = self.tokenCaches[lang]
+        result = [cache.get((t, False)) for t in tokens]
+        missing = list(dict.fromkeys(t for t, w in zip(tokens, result) if w is None))
+        if len(missing) <= 0:
+            return result
+        analyses = {}
+        if self.store is not None:
+            analyses = self.store.get_many(lang, missing)
+            for t, w in analyses.items():
+                cache.put((t, False), w)
+            missing = [t for t in missing if t not in analyses]
+        if len(missing) > 0:
+            newAnalyses = dict(zip(missing, words_to_records(self.analyze_words(lang, missing, format='json'))))
+            for t, w in newAnalyses.items():
+                cache.put((t, False), w)
+            if self.store is not None:
+                self.store.put_many(lang, newAnalyses)
+            analyses.update(newAnalyses)
+        return [w if w is not None else analyses[t] for t, w in zip(tokens, result)]
+
+    def analyze_sentences(self, lang, sentences):
+        """
+        Analyze a list of tokenized sentences with one uniparser call.
+        Return a list of lists of tuples of analyses.
+        """
+        if lang in self.disamb_langs:
+            TOKENS.inc(sum(len(tokens) for tokens in sentences), lang=lang)
+            return [words_to_records(words)
+                    for words in self.analyze_words(lang, sentences, disambiguate=True, format='json')]
+        analyses = self.analyze_tokens(lang, [t for tokens in sentences for t in tokens])
+        result = []
+        iStart = 0
+        for tokens in sentences:
+            result.append(analyses[iStart:iStart + len(tokens)])
+            iStart += len(tokens)
+        return result
+
+    def transliterate(self, lang, analyses):
+        """
+        Take a list of tuples of analyses of a sentence. Return a dictionary
+        with these analyses under the 'default' key and their transliterated
+        versions under the names of the transliterations available for the language.
+        """
+        result = {'default': analyses}
+        if 'translit' not in self.langs[lang]:
+            return result
+        with STAGE_SECONDS.time(stage='translit', lang=lang):
             for translit, f in self.langs[lang]['translit'].items():
                 resultTranslit = []
                 for w in result['default']:
-                    wTranslit = copy.deepcopy(w)
-                    for ana in wTranslit:
-                        ana['wf'] = f(ana['wf'])
-                        if 'lemma' in ana:
-                            ana['lemma'] = f(ana['lemma'])
-                        if 'wfGlossed' in ana:
-                            ana['wfGlossed'] = f(ana['wfGlossed'])
-                    resultTranslit.append(wTranslit)
+                    # The fields that are not transliterated, such as gramm
+                    # tuples, are shared with the default analysis.
+                    resultTranslit.append(tuple(
+                        ana.replace(wf=f(ana.wf), lemma=f(ana.lemma),
+                                    wfGlossed=f(ana.wfGlossed) if ana.wfGlossed is not None else None)
+                        for ana in w
+                    ))
                 result[translit] = resultTranslit
         return result
 
+    def cache_stats(self):
+        """
+        Return token cache, transliteration cache and persistent store
+        statistics for each language.
+        """
+        return {
+            'tokens': {lang: cache.stats() for lang, cache in self.tokenCaches.items()},
+            'translit': {lang: {translit: f.stats() for translit, f in self.langs[lang]['translit'].items()}
+                         for lang in self.langs if 'translit' in self.langs[lang]},
+            'store': self.store.stats() if self.store is not None else {}
+        }
+
+    def analyze(self, lang, sentence):
+        if lang not in self.langs:
+            return ''
+        with STAGE_SECONDS.time(stage='tokenize', lang=lang):
+            tokens = self.tokenize(sentence)
+        return self.transliterate(lang, self.analyze_tokens(lang, tokens))
+
+    def analyze_batch(self, lang, sentences, translit=True):
+        """
+        Analyze a list of sentences in one go. Each sentence is either
+        a string or a list of tokens. Return a list with a dictionary
+        of analyses for each sentence (see transliterate()).
+        """
+        if lang not in self.langs:
+            return []
+        with STAGE_SECONDS.time(stage='tokenize', lang=lang):
+            sentences = [self.tokenize(s) if type(s) == str else [t for t in s if len(t) > 0]
+                         for s in sentences]
+        result = self.analyze_sentences(lang, sentences)
+        if not translit:
+            return [{'default': analyses} for analyses in result]
+        return [self.transliterate(lang, analyses) for analyses in result]
+
 
 class PaperParser:
     rxPuncR = re.compile('^[.,?!:;)"/\\-\\]”]+$')
@@ -142,43 +309,31 @@ class PaperParser:
                             '(?: *([^ \r\n][^\r\n]*?) *\n)?|(?<=\n)([^\n]*\n)',
                             flags=re.DOTALL)
     rxStemGloss = re.compile('[ ,;:()]+')
+    # Object language words: words with special characters, suffixes and
+    # words from the list in data/words_<lang>.txt
     rxWordLang = {
         'beserman': re.compile('(?<= )-[\\w(́)]*[əɤʼčšžǯɨ́ʉ̯ʌɘʲ͡ɕʂʐʑˌа-яёӵӝӟӥӧʙ̥ʔ̩̥ː][\\ẃ()-]*|'
                                '[-\\ẃ]*[əɤʼčšžǯɨ́ʉ̯ʌɘʲ͡ɕʂʐʑˌа-яёӵӝӟӥӧʙ̥ʔ̩̥ː][-\\ẃ]*|'
                                '(?<= )-[\\w()-]+-(?= )|(?<= )-[\\w()-]+\\b|'
-                               '\\b(ta|[mt]on|ben|uk|mare?|(ta|so)os(len)?|nu|(ta|so)je|'
-                               'das|og|og-og[^ \r\n]*|kud|kudi[^ \r\n]*|perv[oi]j[^ \r\n]*|'
-                               'pe|val|palaz|u[gmzd]|na|tak|odig[^ \r\n]*|se?re|ma|ik|mh|vot|tare|'
-                               'ke|ja|bere|pun[eoi]?[mdz]?|gine|(so|ta)iz[^ \r\n]*|gord|marke|'
-                               'e[jzmd]|(ta|so)len|(ta|so)(in|len|tek)|tros|bur|luoz|naverno|'
-                               'pis|pu|pispu|vu(?:e|i[dzm]?)?|gur|taba|polka|tarelka|ki|mesta(je[zd]?)?|'
-                               'dur|pum(?:ez?)?|sereg(?:ez?)?|reka|gorode?|azbar(e|a[mdz])?|'
-                               'pal(?:a[mdz]?)?|a[nt]aj(je[dz]?)?|ul[eoi]?|punna[mdz]?|'
-                               'kolxoz(e[dz]?)?|koko(je[dz]?)?|sugan(je[dz]?)?|kureg[^ \r\n]*|skal(je[dz]?)?|'
-                               'pi|dore|vaj[eo]?|med|da|wa|olo|abi(len)?|jun|\\w+jos(len)?|\\wjez(len)?|'
-                               'korka[^ \r\n]*|aslam|poti[zdm]?|kule|lue|murt[^ \r\n]*)\\b',
+                               + word_list_regex('words_beserman.txt'),
                                flags=re.DOTALL)
     }
     rxEnlitics = {
         'beserman': re.compile('^([gk][iʌ]ne|uk|ik|nʲi|vedʲ|ʐe|to|no|na|ʂatʲ|ke|pe|w?a|dak|ka)$', flags=re.I)
     }
+    # Glosses listed in data/glosses_<lang>.txt
     rxGlosses = {
-        'beserman': re.compile('\\b(IDEO|REP|AUTOREP|ENIM|(?<![‘\'])ID(?!=\\.)|'
-                               'IAM|Q|IMP(?:\\.MTG)?|PROH|HESIT|COMPL|BCKGR|FC|'
-                               'PRS|PST(?:\\.EVID(?:\\.NEG(?:\\.[123]+)?(?:\\.?(?:SG|PL))?)?)?|'
-                               'FUT|(?:ACC\\.)?[123](?:SG|PL)(?:\\.POSS)?|NOT\\.EXIST|'
-                               'INDEF|ITER|DETR|CAUS|NOM|GEN2?|ACC(?:\\.PL)?|DAT|INS|(?<=[-.])CAR|ADV|'
-                               'LOC|LAT|EL|PROL|EGR|TERM|APP|RCS|DMS|OPT(?:\\.[123])?|'
-                               'NEG(?:\\.(?:FUT|PRS|PST))?(?:\\.[123]+)?(?:\\.?(?:SG|PL))?|'
-                               'CNG(?:\\.(?:FUT|PRS|PST))?(?:\\.[123]+)?(?:\\.?(?:SG|PL))?|'
-                               'COND|COMP|PROP|ATTR|MULT|INF(?:\\.CESS)?|RES|DEB|'
-                               'NMLZ|PTCP(?:\\.(?:ACT|NEG|PST|HAB|DEB))?(?:\\.NEG)?|'
-                               'ORD|ADVLOC|ADVTEMP|EXHST|DELIM|APPRNUM|RUS|PPF|'
-                               'EXCL|INCL|(?<![ ‘\'(])ADD|CONTR|NPST|NLOC|'
-                               'CVB(?:\\.(?:NEG|SIM[1-5]?|LIM|REAS\\.NEG))?|PL(?:\\.ADJ)?|SG)\\b',
+        'beserman': re.compile(word_list_regex('glosses_beserman.txt', ignoreCase=True),
                                flags=re.DOTALL|re.I)
     }
-    rxGlossesNonGlosses = re.compile('([^$]+)')
+    # Whether a gloss found in the text is still recognized when it stands alone
+    # (those recognized by their context, such as CAR after a hyphen, are not)
+    glossAlone = {lang: MemoizedFunction(lambda gloss, rx=rx: rx.search(gloss) is not None, 10000)
+                  for lang, rx in rxGlosses.items()}
+    rxBlank = re.compile('^[ \t]*$')
+    rxParaRuns = re.compile('<i>.+?</i>|(?:[^<]|<[^i])+')
+    rxEmptyParaRun = re.compile('^(?:[ \r\n]*|<i> *</i>[ \r\n]*)$', flags=re.DOTALL)
+    rxSectionHeader = re.compile('^[^<>]{0,65}[^.?!:;)<> -] *$')
 
     @staticmethod
     def clean_punc(text):
@@ -223,51 +378,115 @@ class PaperParser:
         p.paragraph_format.space_before = Cm(0)
         p.paragraph_format.space_after = Cm(0)
 
+    @staticmethod
+    def gloss_runs(text, lang):
+        """
+        Split the text into runs with and without glosses. Return a list
+        of (text, smallCaps) pairs; glosses are lowercased, so that they
+        can be typeset in small caps.
+        """
+        if lang not in PaperParser.rxGlosses:
+            return [(text, False)]
+        runs = []
+        iStart = 0
+        # Dollar signs are dropped: they used to be the markers of glosses
+        for m in PaperParser.rxGlosses[lang].finditer(text):
+            runs += [(run, False) for run in text[iStart:m.start()].split('$') if len(run) > 0]
+            gloss = m.group(1).lower()
+            runs.append((gloss, PaperParser.glossAlone[lang](gloss)))
+            iStart = m.end()
+        runs += [(run, False) for run in text[iStart:].split('$') if len(run) > 0]
+        return runs
+
     @staticmethod
     def smallcaps_glosses(p, text, lang):
-        if lang in PaperParser.rxGlosses:
-            text = PaperParser.rxGlosses[lang].sub(lambda m: '$' + m.group(1).lower() + '$', text)
-            for run in PaperParser.rxGlossesNonGlosses.findall(text):
-                if PaperParser.rxGlosses[lang].search(run) is not None:
-                    p.add_run(run).font.small_caps = True
-                else:
-                    p.add_run(run)
-        else:
+        if lang not in PaperParser.rxGlosses:
             p.text = text
+            return
+        for run, smallCaps in PaperParser.gloss_runs(text, lang):
+            if smallCaps:
+                p.add_run(run).font.small_caps = True
+            else:
+                p.add_run(run)
+
+    @staticmethod
+    def segment_key(*parts):
+        """
+        Return the key of a segment of a paper-mode text in the segment
+        cache: a hash of everything its processed version depends on.
+        """
+        return hashlib.sha256('\n'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
 
-    def __init__(self, analyzer):
+    def __init__(self, analyzer, renderer=None):
         self.analyzer = analyzer
-        self.templates = {}  # Jinja2 template cache
+        if renderer is None:
+            renderer = Renderer(analyzer.settings['render_cache_size'])
+        self.renderer = renderer
+        # Processed segments (examples and paragraphs) of paper-mode texts
+        # by their hash, so that a resubmitted text with a few changes
+        # only has its changed segments processed again
+        self.segmentCache = LRUCache(analyzer.settings['paper_segment_cache_size'])
 
-    def render_jinja_html(self, templateDir, templateFilename, **context):
+    def segment_cache(self, useCache):
         """
-        Render a flask template without flask context (needed if
-        this file is imported from outside the package).
+        Return the segment cache, or an empty cache that keeps nothing
+        if useCache is False (e.g. the client asked for a fresh response).
         """
+        if useCache:
+            return self.segmentCache
+        return LRUCache(0)
+
+    def analyze_examples(self, lang, texts, progress=None):
+        """
+        Analyze the texts of the examples in chunks of paper_batch_size
+        texts, one uniparser call per chunk. If there is a process pool,
+        the chunks are analyzed in parallel. Return a dictionary
+        {text: analysis (see Analyzer.analyze())}. If progress is given,
+        it is called as progress(nExamplesDone, nExamples) after each chunk.
+        """
+        counts = Counter(texts)
+        uniqueTexts = list(counts)
+        chunkSize = self.analyzer.settings['paper_batch_size']
+        chunks = [uniqueTexts[i:i + chunkSize] for i in range(0, len(uniqueTexts), chunkSize)]
+        analyses = {}
+        nExamplesDone = 0
+
+        def analyze_chunk(chunk):
+            return self.analyzer.analyze_batch(lang, chunk)
+
+        if self.analyzer.pool is not None and len(chunks) > 1:
+            executor = ThreadPoolExecutor(self.analyzer.settings['pool_workers'])
+            chunkAnalyses = executor.map(analyze_chunk, chunks)
+        else:
+            executor = None
+            chunkAnalyses = map(analyze_chunk, chunks)
         try:
-            template = self.templates[(templateDir, templateFilename)]
-        except KeyError:
-            template = jinja2.Environment(
-                loader=jinja2.FileSystemLoader(templateDir + '/')
-            ).get_template(templateFilename)
-            self.templates[(templateDir, templateFilename)] = template
-        return template.render(context)
-
-    def process_example(self, lang, num, text, trans, wordDoc=None):
-        if re.search('^[ \t]*$', text) is not None:
-            return ''
-        result = self.analyzer.analyze(lang, text)
-        if 'IPA' in result:
-            result = result['IPA']
+            for chunk, analysis in zip(chunks, chunkAnalyses):
+                analyses.update(zip(chunk, analysis))
+                nExamplesDone += sum(counts[t] for t in chunk)
+                if progress is not None:
+                    progress(nExamplesDone, len(texts))
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return analyses
+
+    def words_glosses(self, lang, analysis):
+        """
+        Return the words of an example and their glosses as two lists,
+        given the analysis of its text (see Analyzer.analyze()).
+        """
+        if 'IPA' in analysis:
+            result = analysis['IPA']
         else:
-            result = result['default']
+            result = analysis['default']
         words = []
         glosses = []
         hangingPuncL = ''
         for w in result:
             if len(w) <= 0:
                 continue
-            wf = w[0]['wf']
+            wf = w[0].wf
             if self.rxPuncR.search(wf) is not None:
                 if len(words) > 0:
                     words[-1] += wf
@@ -283,10 +502,13 @@ class PaperParser:
             curWfParts = set()
             curTrans = set()
             for ana in w:
-                curWfParts.add(ana['wfGlossed'])
-                curGlosses.add(ana['gloss'])
-                if 'trans_ru' in ana:
-                    curTrans.add(ana['trans_ru'])
+                # Some grammars have no glosses or glossed wordforms
+                if ana.wfGlossed:
+                    curWfParts.add(ana.wfGlossed)
+                if ana.gloss:
+                    curGlosses.add(ana.gloss)
+                if ana.get('trans_ru') is not None:
+                    curTrans.add(ana.trans_ru)
             curGlosses = [g for g in sorted(curGlosses, key=lambda x: (x.count('-'), len(x), x))
                           if len(g) > 0]
             curWfParts = [p for p in sorted(curWfParts, key=lambda x: (x.count('-'), max(len(p) for p in x.split('-')), x))
@@ -309,57 +531,111 @@ class PaperParser:
                 words.append(wf)
                 glosses.append(gloss)
 
+        return words, glosses
+
+    def process_example(self, lang, num, text, trans, wordDoc=None, wordsGlosses=None, tableBuilder=None,
+                        html=True, useCache=True):
+        """
+        Gloss one example and return its HTML (or an empty string if html
+        is False). If the words and glosses of the example (see words_glosses())
+        are not given, the text is analyzed here. If wordDoc is given,
+        the interlinear table of the example is added to it with
+        tableBuilder (a DocxTableBuilder for this document). The HTML and
+        the table are taken from the segment cache if they are there
+        and useCache is True.
+        """
+        if self.rxBlank.search(text) is not None:
+            return ''
+        segmentCache = self.segment_cache(useCache)
+        if wordsGlosses is None:
+            wordsGlosses = self.words_glosses(lang, self.analyzer.analyze(lang, text))
+        words, glosses = wordsGlosses
         if wordDoc is not None:
-            nCharsWords = len(''.join(w.strip() for w in words))
-            nCharsGloss = len(''.join(re.sub('[а-яё][а-яё ,.\\-()]+',
-                                             'XXXXXX', g.strip()) for g in glosses))
-            nRows = max(nCharsWords // 56, nCharsGloss // 76) + 1
-            nCols = 1 + math.ceil(len(words) / nRows)
-            table = wordDoc.add_table(rows=nRows * 2 + 1, cols=nCols)
-            p = table.cell(0, 0).paragraphs[0]
-            p.text = '(' + str(num) + ')'
-            PaperParser.p_no_margins(wordDoc, p)
-            for iRow in range(nRows):
-                p = table.cell(iRow + 1, 0).paragraphs[0]
-                PaperParser.p_no_margins(wordDoc, p)
-                p = table.cell(iRow + 2, 0).paragraphs[0]
-                PaperParser.p_no_margins(wordDoc, p)
-            for iCell in range(len(words)):
-                if iCell >= len(glosses):
-                    break
-                iRow = iCell // (nCols - 1)
-                iCol = iCell - iRow * (nCols - 1) + 1
-                if iCell >= 1:
-                    table.cell(nRows * 2, 1).merge(table.cell(nRows * 2, iCol))
-                p = table.cell(iRow * 2, iCol).paragraphs[0]
-                p.add_run(words[iCell].strip()).italic = True
-                PaperParser.p_no_margins(wordDoc, p)
-                p = table.cell(iRow * 2 + 1, iCol).paragraphs[0]
-                p.style = wordDoc.styles['Gloss']
-                PaperParser.p_no_margins(wordDoc, p, 'Gloss')
-                if re.search('^(?:[ /*?!.,()_-]*|\\[S[0-9]+\\]:?)$', words[iCell].strip()) is not None:
-                    continue
-                PaperParser.smallcaps_glosses(p, glosses[iCell].strip(), lang)
-            p = table.cell(nRows * 2, 1).paragraphs[0]
-            p.text = trans
-            PaperParser.p_no_margins(wordDoc, p)
-            # self.set_cell_margins(table, 0, 0)
-            table.autofit = True
-
-        return self.render_jinja_html('web_app/templates',
-                                      'analysis_paper.html',
-                                      num=num,
-                                      words=words,
-                                      glosses=glosses,
-                                      translation=trans).strip()
-
-    def analyze(self, lang, text):
-        if lang not in self.analyzer.langs:
-            return text
-        text = '\n' + text.strip() + '\n'
-        text = PaperParser.clean_punc(text)
-        segments = self.rxExamples.findall(text)
-        textProcessed = ''
+            if tableBuilder is None:
+                tableBuilder = DocxTableBuilder(wordDoc, PaperParser.gloss_runs)
+            key = PaperParser.segment_key('docx', lang, num, text, trans, tableBuilder.blockWidth)
+            tableXML = segmentCache.get(key)
+            if tableXML is None:
+                tableXML = tableBuilder.table_xml(lang, num, words, glosses, trans)
+                segmentCache.put(key, tableXML)
+            tableBuilder.add_xml(tableXML)
+        if not html:
+            return ''
+
+        key = PaperParser.segment_key('html', lang, num, text, trans)
+        exampleHTML = segmentCache.get(key)
+        if exampleHTML is None:
+            with STAGE_SECONDS.time(stage='render', lang=lang):
+                exampleHTML = self.renderer.render('analysis_paper.html',
+                                                   num=num,
+                                                   words=words,
+                                                   glosses=glosses,
+                                                   translation=trans).strip()
+            segmentCache.put(key, exampleHTML)
+        return exampleHTML
+
+    def examples_words_glosses(self, lang, texts, progress=None, useCache=True):
+        """
+        Return a dictionary {text: (words, glosses)} for the texts of
+        the examples (see words_glosses()). Only the texts that are not
+        in the segment cache are analyzed (all of them if useCache
+        is False). If progress is given, it is called as
+        progress(nExamplesDone, nExamples).
+        """
+        segmentCache = self.segment_cache(useCache)
+        wordsGlosses = {}
+        for text in set(texts):
+            cached = segmentCache.get(PaperParser.segment_key('words', lang, text))
+            if cached is not None:
+                wordsGlosses[text] = cached
+        newTexts = [text for text in texts if text not in wordsGlosses]
+        nCached = len(texts) - len(newTexts)
+        newProgress = None
+        if progress is not None:
+            newProgress = lambda nExamplesDone, nExamples: progress(nCached + nExamplesDone, len(texts))
+        for text, analysis in self.analyze_examples(lang, newTexts, newProgress).items():
+            wordsGlosses[text] = self.words_glosses(lang, analysis)
+            segmentCache.put(PaperParser.segment_key('words', lang, text), wordsGlosses[text])
+        return wordsGlosses
+
+    @staticmethod
+    def add_paragraph(wordDoc, lang, para, prevTitle):
+        """
+        Add a paragraph of text between the examples (with the object
+        language words in <i> tags) to the Word document. Return the new
+        paragraph, or None if there was nothing to add, and whether it is
+        a section header.
+        """
+        paraRuns = PaperParser.rxParaRuns.findall(para.strip('\r\n'))
+        if len(paraRuns) <= 0 or (len(paraRuns) == 1
+                                  and PaperParser.rxEmptyParaRun.search(paraRuns[0]) is not None):
+            return None, prevTitle
+        p = wordDoc.add_paragraph('')
+        p.style = wordDoc.styles['Normal']
+        if not prevTitle:
+            p.paragraph_format.first_line_indent = Cm(1)
+        p.paragraph_format.space_before = Cm(0)
+        p.paragraph_format.space_after = Cm(0)
+        if (len(paraRuns) == 1
+                and PaperParser.rxSectionHeader.search(paraRuns[0]) is not None
+                and not paraRuns[0].startswith('Table')):
+            p.add_run('XX.X ' + paraRuns[0]).bold = True
+            p.style = wordDoc.styles['Section header']
+            p.paragraph_format.space_before = Pt(12)
+            p.paragraph_format.first_line_indent = Cm(0)
+            return p, True
+        for paraRun in paraRuns:
+            if paraRun.startswith('<i>'):
+                p.add_run(paraRun[3:len(paraRun)-4]).italic = True
+            else:
+                PaperParser.smallcaps_glosses(p, paraRun, lang)
+        return p, False
+
+    @staticmethod
+    def new_document():
+        """
+        Create an empty Word document with the styles used for glossed papers.
+        """
         wordDoc = Document()
         glossStyle = wordDoc.styles.add_style('Gloss', WD_STYLE_TYPE.PARAGRAPH)
         headerStyle = wordDoc.styles.add_style('Section header', WD_STYLE_TYPE.PARAGRAPH)
@@ -371,60 +647,111 @@ class PaperParser:
         glossStyle.font.size = Pt(9)
         headerStyle.font.name = 'Brill'
         headerStyle.font.size = Pt(10)
+        return wordDoc
+
+    def build_docx(self, lang, text, useCache=True):
+        """
+        Gloss the text and return the resulting Word document
+        as an in-memory file. No HTML is made.
+        """
+        with STAGE_SECONDS.time(stage='docx', lang=lang):
+            wordDoc = PaperParser.new_document()
+            self.analyze(lang, text, wordDoc=wordDoc, html=False, useCache=useCache)
+            return PaperParser.save_docx(wordDoc)
+
+    def build_html_docx(self, lang, text, useCache=True):
+        """
+        Gloss the text once and return a tuple (HTML, Word document
+        as an in-memory file).
+        """
+        with STAGE_SECONDS.time(stage='docx', lang=lang):
+            wordDoc = PaperParser.new_document()
+            textHTML = self.analyze(lang, text, wordDoc=wordDoc, useCache=useCache)
+            return textHTML, PaperParser.save_docx(wordDoc)
+
+    @staticmethod
+    def save_docx(wordDoc):
+        docxFile = io.BytesIO()
+        wordDoc.save(docxFile)
+        docxFile.seek(0)
+        return docxFile
+
+    def analyze(self, lang, text, progress=None, wordDoc=None, html=True, useCache=True):
+        """
+        Gloss all numbered examples in the text and return it as HTML.
+        If wordDoc is given, the glossed text is also added to this
+        Word document (see new_document()); if html is False at the same
+        time, no HTML is made and an empty string is returned. The examples are analyzed
+        together before the glossed text is laid out. If progress is given,
+        it is called as progress(nExamplesDone, nExamples) as the examples
+        are being analyzed. If useCache is False, the segment cache is
+        not used, so that every segment is processed anew.
+        """
+        if lang not in self.analyzer.langs:
+            return text
+        segmentCache = self.segment_cache(useCache)
+        text = '\n' + text.strip() + '\n'
+        text = PaperParser.clean_punc(text)
+        segments = self.rxExamples.findall(text)
+        nExamples = sum(1 for seg in segments if len(seg[1]) > 0)
+        exampleTexts = [seg[1] for seg in segments
+                        if len(seg[1]) > 0 and self.rxBlank.search(seg[1]) is None]
+        wordsGlosses = self.examples_words_glosses(lang, exampleTexts, progress, useCache)
+        tableBuilder = None
+        if wordDoc is not None:
+            tableBuilder = DocxTableBuilder(wordDoc, PaperParser.gloss_runs)
+        # Object language words are transliterated into IPA if there is such a transliteration
+        transliterator = self.analyzer.langs[lang].get('translit', {}).get('IPA', lambda s: s)
+        textProcessed = ''
         prevTitle = True
         prevExample = False
         for seg in segments:
             if len(seg[1]) == 0 and len(seg[3]) == 0:
-                textProcessed += '<br>'
+                if html:
+                    textProcessed += '<br>'
             elif len(seg[3]) > 0 and len(seg[1]) <= 0:
-                para = seg[3]
-                if lang in self.rxWordLang:
-                    if 'IPA' in self.analyzer.langs[lang]['translit']:
-                        transliterator = self.analyzer.langs[lang]['translit']['IPA']
-                    else:
-                        transliterator = lambda s: s
-                    para = self.rxWordLang[lang].sub(lambda m: '<i>' + transliterator(m.group(0)) + '</i>', para)
-                textProcessed += '<p>' + para.replace('\n', '</p>\n<p>')[:-3]
-                paraRuns = re.findall('<i>.+?</i>|(?:[^<]|<[^i])+', para.strip('\r\n'))
-                if len(paraRuns) > 1 or (len(paraRuns) == 1
-                                         and re.search('^(?:[ \r\n]*|<i> *</i>[ \r\n]*)$',
-                                                       paraRuns[0], flags=re.DOTALL) is None):
-                    p = wordDoc.add_paragraph('')
-                    p.style = wordDoc.styles['Normal']
+                key = PaperParser.segment_key('paragraph', lang, seg[3])
+                para = segmentCache.get(key)
+                if para is None:
+                    para = seg[3]
+                    if lang in self.rxWordLang:
+                        para = self.rxWordLang[lang].sub(lambda m: '<i>' + transliterator(m.group(0)) + '</i>', para)
+                    segmentCache.put(key, para)
+                if html:
+                    textProcessed += '<p>' + para.replace('\n', '</p>\n<p>')[:-3]
+                if wordDoc is None:
+                    continue
+                # The paragraph in the Word document also depends on
+                # whether it follows a section header
+                key = PaperParser.segment_key('docx paragraph', lang, seg[3], prevTitle)
+                cached = segmentCache.get(key)
+                if cached is None:
+                    p, nextPrevTitle = PaperParser.add_paragraph(wordDoc, lang, para, prevTitle)
+                    cached = (None if p is None else etree.tostring(p._p, encoding='unicode'), nextPrevTitle)
+                    segmentCache.put(key, cached)
+                elif cached[0] is not None:
+                    tableBuilder.add_xml(cached[0])
+                if cached[0] is not None:
                     prevExample = False
-                    if not prevTitle:
-                        p.paragraph_format.first_line_indent = Cm(1)
-                    p.paragraph_format.space_before = Cm(0)
-                    p.paragraph_format.space_after = Cm(0)
-                    if (len(paraRuns) == 1
-                            and re.search('^[^<>]{0,65}[^.?!:;)<> -] *$', paraRuns[0]) is not None
-                            and not paraRuns[0].startswith('Table')):
-                        p.add_run('XX.X ' + paraRuns[0]).bold = True
-                        p.style = wordDoc.styles['Section header']
-                        p.paragraph_format.space_before = Pt(12)
-                        p.paragraph_format.first_line_indent = Cm(0)
-                        prevTitle = True
-                    else:
-                        prevTitle = False
-                        for paraRun in paraRuns:
-                            if paraRun.startswith('<i>'):
-                                p.add_run(paraRun[3:len(paraRun)-4]).italic = True
-                            else:
-                                PaperParser.smallcaps_glosses(p, paraRun, lang)
+                prevTitle = cached[1]
             else:
                 print(seg)
-                if not prevExample:
-                    p = wordDoc.add_paragraph('')
-                    PaperParser.p_no_margins(wordDoc, p)
+                if not prevExample and wordDoc is not None:
+                    tableBuilder.add_empty_paragraph()
                 prevExample = True
-                trans = self.rxWordLang[lang].sub(lambda m: self.analyzer.langs[lang]['translit']['IPA'](m.group(0)), seg[2])
+                trans = seg[2]
+                if lang in self.rxWordLang:
+                    trans = self.rxWordLang[lang].sub(lambda m: transliterator(m.group(0)), trans)
                 textProcessed += self.process_example(lang, seg[0], seg[1],
                                                       trans,
-                                                      wordDoc)
-                p = wordDoc.add_paragraph('')
-                PaperParser.p_no_margins(wordDoc, p)
-        if not os.path.exists('docx'):
-            os.makedirs('docx')
-        wordDoc.save('docx/processed.docx')
+                                                      wordDoc,
+                                                      wordsGlosses=wordsGlosses.get(seg[1]),
+                                                      tableBuilder=tableBuilder,
+                                                      html=html,
+                                                      useCache=useCache)
+                if wordDoc is not None:
+                    tableBuilder.add_empty_paragraph()
+        if progress is not None:
+            progress(nExamples, nExamples)
         return textProcessed
 
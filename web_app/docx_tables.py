@@ -0,0 +1,138 @@
+import re
+import math
+from xml.sax.saxutils import escape
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Emu, Inches
+
+# WordprocessingML templates of the interlinear tables. The paragraph
+# properties are those of PaperParser.p_no_margins().
+PPR = '<w:pPr>{style}<w:spacing w:before="0" w:after="0"/><w:ind w:firstLine="0"/></w:pPr>'
+TC = '<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/>{span}</w:tcPr><w:p>{pPr}{runs}</w:p></w:tc>'
+TBL = ('<w:tbl ' + nsdecls('w') + '><w:tblPr><w:tblW w:type="auto" w:w="0"/>'
+       '<w:tblLayout w:type="autofit"/><w:tblLook w:firstColumn="1" w:firstRow="1" '
+       'w:lastColumn="0" w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+       '</w:tblPr><w:tblGrid>{grid}</w:tblGrid>{rows}</w:tbl>')
+RPR_ITALIC = '<w:rPr><w:i/></w:rPr>'
+RPR_SMALLCAPS = '<w:rPr><w:smallCaps/></w:rPr>'
+rxRussianGloss = re.compile('[а-яё][а-яё ,.\\-()]+')
+rxNoGloss = re.compile('^(?:[ /*?!.,()_-]*|\\[S[0-9]+\\]:?)$')
+
+
+def run_xml(text, rPr=''):
+    """
+    Return the XML of a run with the given text, which is split
+    into w:t, w:tab and w:br elements the same way python-docx does it.
+    """
+    content = []
+    for part in re.split('([\t\r\n])', text or ''):
+        if part == '\t':
+            content.append('<w:tab/>')
+        elif part in ('\r', '\n'):
+            content.append('<w:br/>')
+        elif len(part) > 0:
+            if len(part.strip()) < len(part):
+                content.append('<w:t xml:space="preserve">' + escape(part) + '</w:t>')
+            else:
+                content.append('<w:t>' + escape(part) + '</w:t>')
+    return '<w:r>' + rPr + ''.join(content) + '</w:r>'
+
+
+class DocxTableBuilder:
+    """
+    Adds the interlinear tables of glossed examples to a Word document
+    created by PaperParser.new_document(). Adding a table through python-docx
+    cell by cell (and merging the translation row one cell at a time)
+    takes most of the time of building a document, so the XML of the whole
+    table is put together from templates and parsed once. The paragraph
+    properties of each style are prepared when the builder is created.
+    gloss_runs(text, lang) returns the runs of a gloss as a list
+    of (text, smallCaps) pairs.
+    """
+
+    def __init__(self, wordDoc, gloss_runs):
+        self.wordDoc = wordDoc
+        self.gloss_runs = gloss_runs
+        section = wordDoc.sections[-1]
+        self.blockWidth = ((section.page_width or Inches(8.5))
+                           - (section.left_margin or Inches(1))
+                           - (section.right_margin or Inches(1)))
+        self.pPr = {
+            'Normal': PPR.format(style=self.style_xml('Normal')),
+            'Gloss': PPR.format(style=self.style_xml('Gloss'))
+        }
+
+    def style_xml(self, styleName):
+        style = self.wordDoc.styles[styleName]
+        if style == self.wordDoc.styles.default(style.type):
+            # The default style is not referenced explicitly
+            return ''
+        return '<w:pStyle w:val="' + escape(style.style_id) + '"/>'
+
+    def add_table(self, lang, num, words, glosses, trans):
+        """
+        Add the table of one example after the last paragraph of the document.
+        """
+        self.add_xml(self.table_xml(lang, num, words, glosses, trans))
+
+    def table_xml(self, lang, num, words, glosses, trans):
+        """
+        Return the XML of the table of one example. The words are laid out
+        in as many rows as needed, each one followed by a row with their
+        glosses; the last row holds the translation.
+        """
+        nCharsWords = len(''.join(w.strip() for w in words))
+        nCharsGloss = len(''.join(rxRussianGloss.sub('XXXXXX', g.strip()) for g in glosses))
+        nRows = max(nCharsWords // 56, nCharsGloss // 76) + 1
+        nCols = 1 + max(1, math.ceil(len(words) / nRows))
+        colWidth = Emu(self.blockWidth // nCols)
+
+        # cells[iRow][iCol] = (paragraph properties, runs)
+        cells = [[('', '')] * nCols for iRow in range(nRows * 2)]
+        for iRow in range(nRows * 2):
+            if iRow <= nRows + 1:
+                cells[iRow][0] = (self.pPr['Normal'], '')
+        cells[0][0] = (self.pPr['Normal'], run_xml('(' + str(num) + ')'))
+        for iCell in range(min(len(words), len(glosses))):
+            iRow = iCell // (nCols - 1)
+            iCol = iCell - iRow * (nCols - 1) + 1
+            word = words[iCell].strip()
+            cells[iRow * 2][iCol] = (self.pPr['Normal'], run_xml(word, RPR_ITALIC))
+            runs = ''
+            if rxNoGloss.search(word) is None:
+                runs = ''.join(run_xml(text, RPR_SMALLCAPS if smallCaps else '')
+                               for text, smallCaps in self.gloss_runs(glosses[iCell].strip(), lang))
+            cells[iRow * 2 + 1][iCol] = (self.pPr['Gloss'], runs)
+
+        tc = TC.format(width=colWidth.twips, span='', pPr='{pPr}', runs='{runs}')
+        rows = [''.join(tc.format(pPr=pPr, runs=runs) for pPr, runs in row)
+                for row in cells]
+        # The translation takes the whole width of the table except the first column
+        span = ''
+        if nCols > 2:
+            span = '<w:gridSpan w:val="' + str(nCols - 1) + '"/>'
+        translationRow = (tc.format(pPr=self.pPr['Normal'] if nRows * 2 <= nRows + 1 else '', runs='')
+                          + TC.format(width=colWidth.twips * (nCols - 1), span=span,
+                                      pPr=self.pPr['Normal'], runs=run_xml(trans)))
+        rows.append(translationRow)
+        return TBL.format(grid=('<w:gridCol w:w="' + str(colWidth.twips) + '"/>') * nCols,
+                          rows=''.join('<w:tr>' + row + '</w:tr>' for row in rows))
+
+    def add_empty_paragraph(self):
+        """
+        Add an empty paragraph without margins (see PaperParser.p_no_margins())
+        after the last paragraph of the document, e.g. between two tables.
+        """
+        self.add_xml('<w:p ' + nsdecls('w') + '>' + self.pPr['Normal'] + '</w:p>')
+
+    def add_xml(self, blockXML):
+        """
+        Add a table made by table_xml() (or another block element)
+        after the last paragraph of the document.
+        """
+        element = parse_xml(blockXML)
+        body = self.wordDoc.element.body
+        if body.sectPr is not None:
+            body.sectPr.addprevious(element)
+        else:
+            body.append(element)
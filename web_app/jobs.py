@@ -0,0 +1,113 @@
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from .process_pool import PoolBusyError
+
+
+class Job:
+    """
+    One paper-mode document submitted for processing.
+    """
+
+    def __init__(self, lang, text):
+        self.id = uuid.uuid4().hex
+        self.lang = lang
+        self.text = text
+        self.status = 'queued'     # queued, running, done or failed
+        self.nExamplesDone = 0
+        self.nExamples = 0
+        self.html = None
+        self.docx = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def set_progress(self, nExamplesDone, nExamples):
+        self.nExamplesDone = nExamplesDone
+        self.nExamples = nExamples
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': {
+                'done': self.nExamplesDone,
+                'total': self.nExamples
+            }
+        }
+
+
+class JobQueue:
+    """
+    Processes paper-mode documents in background threads, so that
+    the HTTP request submitting a document returns immediately.
+    At most maxPending jobs can be queued or running at the same time.
+    Of the finished (or failed) jobs, only the maxKept most recently
+    submitted ones are remembered; pending jobs are never forgotten.
+    """
+
+    def __init__(self, paperParser, nWorkers=1, maxKept=100, maxPending=100):
+        self.paperParser = paperParser
+        self.maxKept = maxKept
+        self.maxPending = maxPending
+        self.nPending = 0
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        for i in range(nWorkers):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def submit(self, lang, text):
+        """
+        Add a document to the queue and return its Job object.
+        Raise PoolBusyError if there are too many pending jobs.
+        """
+        job = Job(lang, text)
+        with self.lock:
+            if self.nPending >= self.maxPending:
+                raise PoolBusyError('Too many jobs in the queue.')
+            self.nPending += 1
+            self.jobs[job.id] = job
+            self.remove_old()
+        self.queue.put(job)
+        return job
+
+    def remove_old(self):
+        """
+        Forget the oldest finished jobs if there are more than maxKept
+        of them. Must be called with self.lock held.
+        """
+        finished = [jobId for jobId, job in self.jobs.items()
+                    if job.status in ('done', 'failed')]
+        for jobId in finished[:len(finished) - self.maxKept]:
+            del self.jobs[jobId]
+
+    def get(self, jobId):
+        with self.lock:
+            return self.jobs.get(jobId)
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            job.status = 'running'
+            try:
+                job.html = self.paperParser.analyze(job.lang, job.text,
+                                                    progress=job.set_progress)
+                job.status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            with self.lock:
+                self.nPending -= 1
+                self.remove_old()
+            self.queue.task_done()
+
+    def get_docx(self, job):
+        """
+        Return the Word document for a finished job as bytes. It is
+        only built the first time it is requested.
+        """
+        with job.lock:
+            if job.docx is None:
+                job.docx = self.paperParser.build_docx(job.lang, job.text).getvalue()
+            return job.docx
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A thread-safe bounded mapping that discards the least recently
+    used entries when it is full. Keeps hit/miss/eviction counters.
+    """
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxSize <= 0:
+            return
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxSize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        return {
+            'size': len(self.data),
+            'max_size': self.maxSize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class MemoizedFunction:
+    """
+    Wrapper for a function of one string argument (such as a
+    transliterator) that remembers its results in an LRUCache.
+    """
+
+    def __init__(self, f, maxSize):
+        self.f = f
+        self.cache = LRUCache(maxSize)
+
+    def __call__(self, text):
+        result = self.cache.get(text)
+        if result is None:
+            result = self.f(text)
+            self.cache.put(text, result)
+        return result
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
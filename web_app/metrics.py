@@ -0,0 +1,150 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Simple metrics in the Prometheus text exposition format. Each worker
+# process keeps its own values.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(labels):
+    if len(labels) <= 0:
+        return ''
+    return '{' + ','.join(k + '="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                          for k, v in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if type(value) == float and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Metric:
+    """
+    Base class for metrics. If a callback is given, it is called
+    when the metrics are rendered and should return the current values
+    as a dictionary {tuple of (label, value) pairs: value}. This is
+    used for values that are counted elsewhere, e.g. cache statistics.
+    """
+    metricType = ''
+
+    def __init__(self, name, description, callback=None, registry=None):
+        self.name = name
+        self.description = description
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.values = {}
+        if registry is None:
+            registry = REGISTRY
+        registry.register(self)
+
+    def samples(self):
+        if self.callback is not None:
+            values = self.callback()
+            with self.lock:
+                self.values = values
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = ['# HELP ' + self.name + ' ' + self.description,
+                 '# TYPE ' + self.name + ' ' + self.metricType]
+        for name, labels, value in self.samples():
+            lines.append(name + format_labels(labels) + ' ' + format_value(value))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    metricType = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    metricType = 'gauge'
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    metricType = 'histogram'
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, description, registry=registry)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0] * len(self.buckets), 0, 0]
+            counts = self.values[key]
+            for i in range(len(self.buckets)):
+                if value <= self.buckets[i]:
+                    counts[0][i] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Measure how long the code inside the with block takes.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        result = []
+        with self.lock:
+            for labels, (counts, total, n) in sorted(self.values.items()):
+                cumulative = 0
+                for bucket, count in zip(self.buckets, counts):
+                    cumulative += count
+                    result.append((self.name + '_bucket', labels + (('le', format_value(float(bucket))),),
+                                   cumulative))
+                result.append((self.name + '_sum', labels, total))
+                result.append((self.name + '_count', labels, n))
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        return '\n'.join(m.render() for m in self.metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter('uniparser_web_requests_total',
+                   'Number of HTTP requests by endpoint, language and status code.')
+REQUEST_SECONDS = Histogram('uniparser_web_request_duration_seconds',
+                            'Time spent processing HTTP requests.')
+STAGE_SECONDS = Histogram('uniparser_web_stage_duration_seconds',
+                          'Time spent in each processing stage (tokenize, analyze, '
+                          'translit, render, docx).')
+TOKENS = Counter('uniparser_web_tokens_total',
+                 'Number of tokens analyzed.')
+ANALYZER_LOAD_SECONDS = Gauge('uniparser_web_analyzer_load_seconds',
+                              'Time it took to import and load the analyzer for each language.')
+WARMUP_SECONDS = Gauge('uniparser_web_warmup_seconds',
+                       'Time it took to pre-analyze frequent wordforms at startup for each language.')
@@ -0,0 +1,94 @@
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# The Analyzer whose grammars are shared with the worker processes.
+# It is set before the workers are forked, so they inherit it
+# (copy-on-write) instead of loading the grammars again.
+poolAnalyzer = None
+
+
+class PoolBusyError(Exception):
+    """
+    Raised when the analysis queue is full, a task takes too long
+    or a worker process has died.
+    """
+    pass
+
+
+def _start_worker():
+    return True
+
+
+def _analyze_words(lang, words, kwargs):
+    return poolAnalyzer.get_analyzer(lang).analyze_words(words, **kwargs)
+
+
+class AnalysisPool:
+    """
+    Runs uniparser analysis in a pool of worker processes, so that
+    CPU-bound requests do not have to wait for each other on the GIL.
+    The workers are forked after the preloaded grammars have been loaded;
+    languages loaded later are loaded separately by each worker.
+    """
+
+    def __init__(self, analyzer, nWorkers, maxQueue, timeout):
+        global poolAnalyzer
+        poolAnalyzer = analyzer
+        self.nWorkers = nWorkers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(maxQueue)
+        self.lock = threading.Lock()
+        self.executor = self.new_executor()
+
+    def new_executor(self):
+        executor = ProcessPoolExecutor(max_workers=self.nWorkers,
+                                       mp_context=multiprocessing.get_context('fork'))
+        # With the fork start method, all workers are started on the first submit
+        executor.submit(_start_worker).result()
+        return executor
+
+    def replace_broken(self, executor):
+        """
+        Replace the executor after one of its workers has died. All its
+        tasks fail then, so it is replaced only once.
+        """
+        with self.lock:
+            if self.executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self.new_executor()
+
+    def analyze_words(self, lang, words, **kwargs):
+        """
+        Run analyze_words() for the language in one of the workers and
+        return its result. Raise PoolBusyError if there are too many queued
+        tasks already, if the result does not arrive in time or if the
+        worker dies. A task that is already running cannot be stopped, so
+        its slot in the queue is only released when it really finishes.
+        """
+        if not self.slots.acquire(blocking=False):
+            raise PoolBusyError('Too many analysis requests in the queue.')
+        executor = self.executor
+        try:
+            future = executor.submit(_analyze_words, lang, words, kwargs)
+        except BrokenProcessPool:
+            self.slots.release()
+            self.replace_broken(executor)
+            raise PoolBusyError('An analysis worker has died.')
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PoolBusyError('Analysis took too long.')
+        except BrokenProcessPool:
+            self.replace_broken(executor)
+            raise PoolBusyError('An analysis worker has died.')
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
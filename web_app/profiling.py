@@ -0,0 +1,132 @@
+import os
+import io
+import re
+import uuid
+import cProfile
+import pstats
+import threading
+import functools
+from flask import request, jsonify, make_response
+
+# Profiling of individual requests. A request is profiled if profiling
+# is switched on in the settings and the request asks for it with the
+# X-Profile header or the profile query parameter. If profiling is off,
+# the handlers are not wrapped at all.
+
+
+class RequestProfiler:
+    def __init__(self, enabled=False, profileDir='profiles', maxKept=50):
+        self.enabled = enabled
+        self.profileDir = profileDir
+        self.maxKept = maxKept
+        # Only one profiler can be active in a process at a time
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def requested():
+        """
+        Check if the current request asks to be profiled.
+        """
+        flag = request.headers.get('X-Profile', request.args.get('profile', ''))
+        return flag.lower() in ('1', 'true', 'yes')
+
+    def profile(self, f):
+        """
+        Decorator for a view function that returns a JSON response. If the
+        request is profiled, the profile is saved and its ID is added
+        to the response as profile_id.
+        """
+        if not self.enabled:
+            return f
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not self.requested():
+                return f(*args, **kwargs)
+            profiler = cProfile.Profile()
+            with self.lock:
+                profiler.enable()
+                try:
+                    response = make_response(f(*args, **kwargs))
+                finally:
+                    profiler.disable()
+            profileId = self.save(profiler)
+            data = response.get_json(silent=True)
+            if type(data) == dict:
+                # Only the body is changed, so that the status and
+                # the other headers of the response are kept
+                data['profile_id'] = profileId
+                response.set_data(jsonify(data).get_data())
+            # The ETag was made for the unprofiled body, and a profile
+            # is only made for this particular request
+            if 'ETag' in response.headers:
+                del response.headers['ETag']
+            response.headers['Cache-Control'] = 'no-store'
+            response.headers['X-Profile-Id'] = profileId
+            return response
+
+        return wrapper
+
+    def save(self, profiler):
+        """
+        Save the profile in pstats format and return its ID.
+        """
+        os.makedirs(self.profileDir, exist_ok=True)
+        profileId = uuid.uuid4().hex
+        profiler.dump_stats(os.path.join(self.profileDir, profileId + '.prof'))
+        self.remove_old()
+        return profileId
+
+    def remove_old(self):
+        fnames = [os.path.join(self.profileDir, fname) for fname in os.listdir(self.profileDir)
+                  if fname.endswith('.prof')]
+        if len(fnames) <= self.maxKept:
+            return
+        fnames.sort(key=os.path.getmtime)
+        for fname in fnames[:len(fnames) - self.maxKept]:
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+
+    def path(self, profileId):
+        """
+        Return the path to the saved profile with this ID,
+        or None if there is no such profile.
+        """
+        if re.search('^[0-9a-f]{32}$', profileId) is None:
+            return None
+        fname = os.path.join(self.profileDir, profileId + '.prof')
+        if not os.path.exists(fname):
+            return None
+        return fname
+
+    @staticmethod
+    def report(fname, sortBy='cumulative', limit=100):
+        """
+        Return a plain text report for a saved profile.
+        """
+        s = io.StringIO()
+        stats = pstats.Stats(fname, stream=s)
+        stats.sort_stats(sortBy).print_stats(limit)
+        return s.getvalue()
+
+    @staticmethod
+    def collapsed(fname):
+        """
+        Return the profile as collapsed stacks (one "caller;callee time"
+        line per call edge, with time in microseconds), which can be fed
+        to flamegraph tools. cProfile only records direct callers, so the
+        stacks are two frames deep.
+        """
+        stats = pstats.Stats(fname)
+        lines = []
+        for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+            funcName = pstats.func_std_string(func).replace(';', ',')
+            if len(callers) <= 0:
+                lines.append(funcName + ' ' + str(int(tt * 1000000)))
+                continue
+            for caller, callerStats in callers.items():
+                callerName = pstats.func_std_string(caller).replace(';', ',')
+                lines.append(callerName + ';' + funcName + ' ' + str(int(callerStats[2] * 1000000)))
+        return '\n'.join(line for line in lines if not line.endswith(' 0')) + '\n'
@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import threading
+from datetime import datetime
+try:
+    import fcntl
+except ImportError:
+    # Windows: there is only one process writing the log there
+    fcntl = None
+
+
+class QueryLogger:
+    """
+    Writes user queries to a log file, one JSON record per line.
+    Queries are put into an in-memory queue and written in batches
+    by a background thread, so logging never makes a request wait for
+    the disk. If the queue is full, the query is not logged. The log file
+    is rotated when it grows larger than maxBytes. Several worker processes
+    may write to the same file, so rotating and writing are done while
+    holding a lock on fname + '.lock' (where fcntl is available).
+    """
+
+    def __init__(self, fname, sampleRate=1.0, flushSize=100, flushInterval=5,
+                 maxBytes=10 * 1024 * 1024, backupCount=5, maxQueue=10000):
+        self.fname = fname
+        self.sampleRate = sampleRate
+        self.flushSize = flushSize
+        self.flushInterval = flushInterval
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.queue = queue.Queue(maxsize=maxQueue)
+        self.batch = []     # records taken from the queue but not written yet
+        self.nDropped = 0
+        self.pid = None
+        self.lock = threading.Lock()
+        self.startLock = threading.Lock()
+        atexit.register(self.flush)
+
+    def start(self):
+        """
+        Start the writer thread. This is done on the first logged query
+        rather than in the constructor, so that each process gets its own
+        thread even if the app is forked after being imported.
+        """
+        with self.startLock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            threading.Thread(target=self.work, daemon=True).start()
+
+    def log(self, lang, query):
+        if self.sampleRate <= 0 or (self.sampleRate < 1 and random.random() >= self.sampleRate):
+            return
+        if self.pid != os.getpid():
+            self.start()
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'lang': lang,
+            'query': query
+        }
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.nDropped += 1
+
+    def work(self):
+        while True:
+            deadline = time.monotonic() + self.flushInterval
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                with self.lock:
+                    self.batch.append(record)
+                    if len(self.batch) >= self.flushSize:
+                        break
+            self.flush()
+
+    def flush(self):
+        """
+        Write all queued records right away.
+        """
+        with self.lock:
+            while True:
+                try:
+                    self.batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if len(self.batch) <= 0:
+                return
+            if fcntl is None:
+                self.write_batch()
+            else:
+                with open(self.fname + '.lock', 'a') as fLock:
+                    fcntl.flock(fLock, fcntl.LOCK_EX)
+                    try:
+                        self.write_batch()
+                    finally:
+                        fcntl.flock(fLock, fcntl.LOCK_UN)
+            self.batch = []
+
+    def write_batch(self):
+        self.rotate()
+        with open(self.fname, 'a', encoding='utf-8') as fLog:
+            fLog.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in self.batch))
+
+    def rotate(self):
+        if self.maxBytes <= 0 or not os.path.exists(self.fname) or os.path.getsize(self.fname) < self.maxBytes:
+            return
+        for i in range(self.backupCount - 1, 0, -1):
+            if os.path.exists(self.fname + '.' + str(i)):
+                os.replace(self.fname + '.' + str(i), self.fname + '.' + str(i + 1))
+        if self.backupCount > 0:
+            os.replace(self.fname, self.fname + '.1')
+        else:
+            os.remove(self.fname)
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': self.nDropped
+        }
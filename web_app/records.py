@@ -0,0 +1,136 @@
+import sys
+
+
+class Analysis:
+    """
+    Compact immutable version of one analysis returned by
+    uniparser's analyze_words(..., format='json'). The fields present in
+    every analysis are stored in slots; all other fields (translations,
+    subwords etc.) are kept in a tuple of (field, value) pairs and can
+    also be accessed as attributes. Gloss and tag strings are interned,
+    since the same few hundred of them occur in almost every analysis.
+    """
+    __slots__ = ('wf', 'lemma', 'gramm', 'wfGlossed', 'gloss', 'other', '_hash')
+    coreFields = ('wf', 'lemma', 'gramm', 'wfGlossed', 'gloss')
+    fields = coreFields + ('other',)
+
+    def __init__(self, wf, lemma='', gramm=(), wfGlossed=None, gloss=None, other=()):
+        object.__setattr__(self, 'wf', wf)
+        object.__setattr__(self, 'lemma', lemma)
+        object.__setattr__(self, 'gramm', gramm)
+        object.__setattr__(self, 'wfGlossed', wfGlossed)
+        object.__setattr__(self, 'gloss', gloss)
+        object.__setattr__(self, 'other', other)
+        object.__setattr__(self, '_hash', None)
+
+    @classmethod
+    def from_json(cls, ana):
+        """
+        Make an Analysis out of a uniparser JSON analysis (a dictionary).
+        """
+        gramm = ana.get('gramm', ())
+        if type(gramm) == dict:
+            # Tags grouped by category: keep them in the same order
+            gramm = [tags for tags in gramm.values()]
+        gramm = tuple(sys.intern(tag) for tag in gramm)
+        gloss = ana.get('gloss')
+        if gloss is not None:
+            gloss = sys.intern(gloss)
+        other = []
+        for field, value in ana.items():
+            if field in cls.coreFields:
+                continue
+            if field == 'subwords':
+                value = tuple(cls.from_json(sw) for sw in value)
+            other.append((sys.intern(field), value))
+        return cls(ana['wf'], ana.get('lemma', ''), gramm,
+                   ana.get('wfGlossed'), gloss, tuple(other))
+
+    def __getattr__(self, field):
+        # Only called for fields that are not in the slots
+        if field in ('other', '_hash'):
+            raise AttributeError(field)
+        for k, v in self.other:
+            if k == field:
+                return v
+        raise AttributeError(field)
+
+    def __setattr__(self, field, value):
+        raise AttributeError('Analysis objects are immutable.')
+
+    def get(self, field, default=None):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            return default
+
+    def replace(self, **fields):
+        """
+        Return a copy of the analysis with some of the core fields
+        replaced. All other values are shared with the original.
+        """
+        values = {field: getattr(self, field) for field in self.fields}
+        values.update(fields)
+        return Analysis(**values)
+
+    def to_json(self):
+        """
+        Return the analysis as a dictionary in the uniparser JSON format.
+        """
+        r = {
+            'wf': self.wf,
+            'lemma': self.lemma,
+            'gramm': list(self.gramm)
+        }
+        if self.wfGlossed is not None:
+            r['wfGlossed'] = self.wfGlossed
+        if self.gloss is not None:
+            r['gloss'] = self.gloss
+        for field, value in self.other:
+            if field == 'subwords':
+                value = [sw.to_json() for sw in value]
+            r[field] = value
+        return r
+
+    def _key(self):
+        return self.wf, self.lemma, self.gramm, self.wfGlossed, self.gloss, self.other
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return isinstance(other, Analysis) and self._key() == other._key()
+
+    def __hash__(self):
+        # Analyses are used as cache keys many times, so the hash
+        # is only computed once
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(self._key()))
+        return self._hash
+
+    def __reduce__(self):
+        return Analysis, (self.wf, self.lemma, self.gramm, self.wfGlossed, self.gloss, self.other)
+
+    def __repr__(self):
+        return 'Analysis(' + repr(self.to_json()) + ')'
+
+
+def words_to_records(words):
+    """
+    Turn a list of lists of JSON analyses (one list per word) into
+    a list of tuples of Analysis objects.
+    """
+    return [tuple(Analysis.from_json(ana) for ana in w) for w in words]
+
+
+def records_to_json(obj):
+    """
+    Turn a structure made of lists, tuples and dictionaries containing
+    Analysis objects into one that can be serialized to JSON.
+    """
+    if isinstance(obj, Analysis):
+        return obj.to_json()
+    if type(obj) in (list, tuple):
+        return [records_to_json(o) for o in obj]
+    if type(obj) == dict:
+        return {k: records_to_json(v) for k, v in obj.items()}
+    return obj
@@ -0,0 +1,121 @@
+import os
+import re
+
+# Regexes made of long lists of alternatives, such as the glosses and the
+# object language words recognized in paper mode, are kept in data files,
+# one alternative per line. alternatives_regex() turns such a list into one
+# trie-shaped regex: alternatives that begin with the same literal characters
+# share them, so at each position of the text the regex engine only follows
+# the branch that begins with the current character instead of trying every
+# alternative in turn. Python tries the alternatives of a regex in their order,
+# so the order is kept wherever it matters: two alternatives are only merged if
+# no alternative between them could match at the same position.
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+METACHARS = '.^$*+?{}[]\\|()'
+QUANTIFIERS = '?*+{'
+rxLookbehind = re.compile('^\\(\\?<[=!](?:\\\\.|[^()\\\\])*\\)')
+
+
+def read_alternatives(fname):
+    """
+    Read a list of regex alternatives from a file in DATA_DIR:
+    one alternative per line, lines starting with # are comments.
+    """
+    alternatives = []
+    with open(os.path.join(DATA_DIR, fname), 'r', encoding='utf-8') as fIn:
+        for line in fIn:
+            line = line.rstrip('\r\n')
+            if len(line) > 0 and not line.startswith('#'):
+                alternatives.append(line)
+    return alternatives
+
+
+def literal_prefix(alternative):
+    """
+    Split a regex alternative into its leading literal characters and the rest.
+    Return a tuple ([(character, regex of the character)], rest). A lookbehind
+    assertion at the beginning goes with the first character.
+    """
+    units = []
+    lookbehind = ''
+    i = 0
+    m = rxLookbehind.search(alternative)
+    if m is not None:
+        lookbehind = m.group(0)
+        i = m.end()
+    while i < len(alternative):
+        c = alternative[i]
+        if c == '\\':
+            if i + 1 >= len(alternative) or alternative[i + 1].isalnum():
+                # Character classes (\w), anchors (\b) and control characters (\n)
+                break
+            char, j = alternative[i + 1], i + 2
+        elif c in METACHARS:
+            break
+        else:
+            char, j = c, i + 1
+        if j < len(alternative) and alternative[j] in QUANTIFIERS:
+            break
+        units.append((char, alternative[i:j]))
+        i = j
+    if len(units) <= 0:
+        return [], alternative
+    units[0] = (units[0][0], lookbehind + units[0][1])
+    return units, alternative[i:]
+
+
+def trie_alternatives(items, ignoreCase):
+    """
+    Turn a list of alternatives split by literal_prefix() into a list
+    of regexes in which alternatives with common prefixes are merged.
+    """
+    branches = []
+    lastBranch = {}     # first character -> the last branch beginning with it
+    for units, rest in items:
+        if len(units) <= 0:
+            # This alternative may match any character (or nothing), so the
+            # alternatives after it cannot be merged with those before it
+            branches.append(rest)
+            lastBranch = {}
+            continue
+        char, regex = units[0]
+        key = regex
+        if ignoreCase:
+            char, key = char.lower(), regex.lower()
+        branch = lastBranch.get(char)
+        if branch is None or branch['key'] != key:
+            branch = {'key': key, 'regex': regex, 'items': []}
+            branches.append(branch)
+            lastBranch[char] = branch
+        branch['items'].append((units[1:], rest))
+    regexes = []
+    for branch in branches:
+        if type(branch) == str:
+            regexes.append(branch)
+            continue
+        suffixes = trie_alternatives(branch['items'], ignoreCase)
+        if len(suffixes) == 1:
+            regexes.append(branch['regex'] + suffixes[0])
+        else:
+            regexes.append(branch['regex'] + '(?:' + '|'.join(suffixes) + ')')
+    return regexes
+
+
+def alternatives_regex(alternatives, ignoreCase=False):
+    """
+    Return a regex that matches the same as '|'.join(alternatives), with
+    common prefixes merged. ignoreCase tells whether it is going to be
+    compiled with re.I. Groups inside the alternatives can end up in
+    a different order, so only the whole match should be used.
+    """
+    return '|'.join(trie_alternatives([literal_prefix(a) for a in alternatives], ignoreCase))
+
+
+def word_list_regex(fname, ignoreCase=False):
+    """
+    Return a regex that matches any of the alternatives listed in the file
+    as a whole word and captures it as its first group.
+    """
+    return '\\b(' + alternatives_regex(read_alternatives(fname), ignoreCase) + ')\\b'
@@ -0,0 +1,52 @@
+import os
+import jinja2
+from .lru_cache import LRUCache
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+class Renderer:
+    """
+    Renders the analysis templates without Flask context. All templates
+    are compiled once, when the renderer is created. The table cell of
+    each word is rendered separately and kept in an LRU cache: analyses
+    are immutable and hashable, so the same cell never has to be
+    rendered twice.
+    """
+
+    def __init__(self, cacheSize=100000):
+        self.env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+                                      autoescape=jinja2.select_autoescape(['html']),
+                                      auto_reload=False)
+        self.templates = {name: self.env.get_template(name)
+                          for name in ('analysis.html', 'analysis_cell.html', 'analysis_paper.html')}
+        self.cell_macro = self.templates['analysis_cell.html'].module.cell
+        self.cellCache = LRUCache(cacheSize)
+
+    def render(self, templateName, **context):
+        return self.templates[templateName].render(context)
+
+    def render_cell(self, w):
+        """
+        Return the HTML of the table cell for one word
+        (a tuple of its analyses).
+        """
+        cell = self.cellCache.get(w)
+        if cell is None:
+            cell = self.cell_macro(w)
+            self.cellCache.put(w, cell)
+        return cell
+
+    def render_analysis(self, analysis):
+        """
+        Render the analysis of a sentence returned by Analyzer.analyze()
+        as HTML tables, one for each transliteration.
+        """
+        if type(analysis) != dict:
+            return ''
+        tables = {translit: [self.render_cell(w) for w in words]
+                  for translit, words in analysis.items()}
+        return self.render('analysis.html', tables=tables)
+
+    def stats(self):
+        return self.cellCache.stats()
@@ -0,0 +1,163 @@
+import time
+import sqlite3
+import hashlib
+import threading
+from .lru_cache import LRUCache
+from .sqlite_connections import SqliteConnections
+
+# Caches of whole /<lang>/analyze responses. A cached value is a pair
+# (ETag, response body). Two backends are available: an in-process
+# LRU cache and an SQLite file that can be shared by several worker
+# processes. Errors of the on-disk backend are treated as cache misses.
+
+
+def normalize_text(text):
+    """
+    Normalize line breaks and remove surrounding whitespace. Texts that
+    only differ in these respects get the same response.
+    """
+    return text.replace('\r\n', '\n').strip()
+
+
+def response_cache_key(lang, query):
+    """
+    Return the cache key for an analysis request. Texts that only differ
+    in line breaks or surrounding whitespace get the same key.
+    """
+    text = normalize_text(query.get('sentence', ''))
+    key = '\n'.join([lang, query.get('mode', ''), query.get('format', ''), text])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def body_etag(body):
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class MemoryResponseCache:
+    """
+    In-process response cache of at most maxSize responses,
+    each of which is kept for ttl seconds.
+    """
+
+    def __init__(self, maxSize, ttl):
+        self.cache = LRUCache(maxSize)
+        self.ttl = ttl
+        self.expired = 0
+
+    def get(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            return None
+        expiry, etag, body = value
+        if time.time() > expiry:
+            self.expired += 1
+            return None
+        return etag, body
+
+    def put(self, key, etag, body):
+        self.cache.put(key, (time.time() + self.ttl, etag, body))
+
+    def stats(self):
+        stats = self.cache.stats()
+        # Expired entries were found in the LRU cache, but they are misses
+        stats['hits'] -= self.expired
+        stats['misses'] += self.expired
+        return stats
+
+
+class SqliteResponseCache:
+    """
+    Response cache stored in an SQLite database, so that it is shared
+    among worker processes and survives restarts. Entries older than
+    ttl seconds are not used. When the number of entries exceeds maxSize,
+    the oldest ones are deleted (updating access times on every hit
+    would turn each read into a write).
+    """
+    cleanupEvery = 100
+
+    def __init__(self, fname, maxSize, ttl):
+        self.fname = fname
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.connections = SqliteConnections(fname)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nPuts = 0
+        conn = self.connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS responses '
+                     '(key TEXT PRIMARY KEY, etag TEXT, body BLOB, created REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS responses_created ON responses (created)')
+
+    def connection(self):
+        return self.connections.get()
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        try:
+            row = self.connection().execute('SELECT etag, body FROM responses WHERE key=? AND created>?',
+                                            (key, time.time() - self.ttl)).fetchone()
+        except sqlite3.Error:
+            row = None
+        self.count(row is not None)
+        if row is None:
+            return None
+        return row[0], bytes(row[1])
+
+    def put(self, key, etag, body):
+        try:
+            conn = self.connection()
+            conn.execute('INSERT OR REPLACE INTO responses (key, etag, body, created) VALUES (?, ?, ?, ?)',
+                         (key, etag, body, time.time()))
+            with self.lock:
+                self.nPuts += 1
+                cleanup = self.nPuts % self.cleanupEvery == 0
+            if cleanup:
+                self.cleanup(conn)
+        except sqlite3.Error:
+            pass
+
+    def cleanup(self, conn):
+        conn.execute('DELETE FROM responses WHERE created<=?', (time.time() - self.ttl,))
+        nDeleted = conn.execute('DELETE FROM responses WHERE key IN '
+                                '(SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                                (self.maxSize,)).rowcount
+        with self.lock:
+            self.evictions += nDeleted
+
+    def __len__(self):
+        try:
+            return self.connection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'max_size': self.maxSize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+def make_response_cache(settings):
+    """
+    Create the response cache described in the settings,
+    or return None if response caching is switched off.
+    """
+    if settings['response_cache'] == 'memory':
+        return MemoryResponseCache(settings['response_cache_size'], settings['response_cache_ttl'])
+    if settings['response_cache'] == 'sqlite':
+        return SqliteResponseCache(settings['response_cache_file'], settings['response_cache_size'],
+                                   settings['response_cache_ttl'])
+    if settings['response_cache'] in (None, 'none'):
+        return None
+    raise ValueError('Unknown response cache backend: ' + str(settings['response_cache']))
@@ -0,0 +1,57 @@
+import os
+import json
+
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'conf', 'settings.json')
+
+DEFAULT_SETTINGS = {
+    'languages': ['beserman'],
+    'preload_languages': [],
+    'token_cache_size': 100000,
+    'translit_cache_size': 100000,
+    'batch_max_sentences': 1000,
+    'stream_chunk_size': 64,
+    'pool_workers': 0,
+    'pool_max_queue': 64,
+    'pool_timeout': 60,
+    'job_workers': 1,
+    'jobs_max_kept': 100,
+    'jobs_max_pending': 100,
+    'docx_texts_kept': 100,
+    'docx_files_kept': 20,
+    'paper_batch_size': 100,
+    'paper_segment_cache_size': 20000,
+    'render_cache_size': 100000,
+    'analysis_store': False,
+    'analysis_store_dir': 'analysis_store',
+    'warmup_frequency_lists': {},
+    'warmup_from_query_log': False,
+    'warmup_top_n': 10000,
+    'warmup_background': True,
+    'response_cache': 'memory',
+    'response_cache_size': 10000,
+    'response_cache_ttl': 3600,
+    'response_cache_max_item_size': 1048576,
+    'response_cache_file': 'response_cache.sqlite',
+    'query_log_file': 'query_log.txt',
+    'query_log_sample_rate': 1.0,
+    'query_log_flush_size': 100,
+    'query_log_flush_interval': 5,
+    'query_log_max_bytes': 10485760,
+    'query_log_backups': 5,
+    'profiling_enabled': False,
+    'profile_dir': 'profiles',
+    'profiles_kept': 50
+}
+
+
+def load_settings(fname=SETTINGS_FILE):
+    """
+    Read the settings from a JSON file and return them as a dictionary.
+    Any values missing from the file are taken from DEFAULT_SETTINGS.
+    """
+    settings = DEFAULT_SETTINGS.copy()
+    if os.path.exists(fname):
+        with open(fname, 'r', encoding='utf-8') as fSettings:
+            settings.update(json.load(fSettings))
+    return settings
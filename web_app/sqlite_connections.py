@@ -0,0 +1,26 @@
+import os
+import sqlite3
+import threading
+
+
+class SqliteConnections:
+    """
+    Connections to one SQLite database, one per thread. SQLite connections
+    cannot be shared among threads or inherited by forked processes, so
+    a new connection is opened in each thread and after a fork. The database
+    is switched to WAL mode, so that several processes can read it while
+    one of them is writing.
+    """
+
+    def __init__(self, fname, timeout=10):
+        self.fname = fname
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def get(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            self.local.conn = sqlite3.connect(self.fname, timeout=self.timeout, isolation_level=None)
+            self.local.conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.pid = os.getpid()
+        return self.local.conn
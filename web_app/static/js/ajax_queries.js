@@ -9,9 +9,13 @@ function analyze() {
 		return;
 	}
 	$('#analyze').toggleClass('btn-primary');
+	if (mode == 'paper') {
+		submit_job();
+		return;
+	}
 	$.ajax({
 		url: curLang + "/analyze",
-		data: {"sentence": $("#sentence").val(), "mode": mode},
+		data: {"sentence": $("#sentence").val(), "mode": mode, "format": "json"},
 		type: "POST",
 		success: process_response,
 		error: function(errorThrown) {
@@ -29,11 +33,122 @@ function process_response(data) {
 		setTimeout(function() { $('#response_message').toggleClass('show'); }, 1000);
 		$('#lexemes_added').html(data.lexemes_added);
 	}
+	if (data.analyses) {
+		data.analysis = render_analysis(data.analyses, data.translits);
+	}
 	if (data.analysis) {
+		if (data.docx_id) {
+			data.analysis = '<p><a href="docx/' + data.docx_id + '">Download DOCX</a></p>' + data.analysis;
+		}
 		$('#result').html(data.analysis)
 	}
 }
 
+function escape_html(s) {
+	return String(s).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;')
+		.replace(/"/g, '&#34;').replace(/'/g, '&#39;');
+}
+
+function render_cell(w) {
+	// Same markup as templates/analysis_cell.html
+	var html = '<td><p class="wf">' + (w.length > 0 ? escape_html(w[0].wf) : '') + '</p>';
+	for (var i = 0; i < w.length; i++) {
+		var ana = w[i];
+		if (i > 0) {
+			html += '<hr>';
+		}
+		if (ana.wfGlossed) {
+			html += '<p class="wfGlossed"><nobr>' + escape_html(ana.wfGlossed) + '</nobr></p>';
+		}
+		if (ana.gloss) {
+			html += '<p class="gloss"><nobr>' + escape_html(ana.gloss) + '</nobr></p>';
+		}
+		if (ana.lemma) {
+			html += '<p class="lemma">' + escape_html(ana.lemma) + '</p>';
+		}
+		if (ana.gramm && ana.gramm.length > 0) {
+			html += '<p class="gramm">' + escape_html(ana.gramm.join(',')) + '</p>';
+		}
+		var transFields = ['trans_en', 'trans_de', 'trans_ru'];
+		for (var j = 0; j < transFields.length; j++) {
+			if (ana[transFields[j]]) {
+				html += '<p class="trans">' + escape_html(ana[transFields[j]]) + '</p>';
+			}
+		}
+	}
+	return html + '</td>';
+}
+
+function render_table(words) {
+	var html = '<table class="analysis_table"><tr>';
+	for (var i = 0; i < words.length; i++) {
+		html += render_cell(words[i]);
+	}
+	return html + '</tr></table>';
+}
+
+function render_analysis(analyses, translits) {
+	// Same markup as templates/analysis.html
+	var html = render_table(analyses['default']);
+	for (var i = 0; i < translits.length; i++) {
+		var k = translits[i];
+		if (k != 'default') {
+			html += '<p class="lead">Transliteration: ' + escape_html(k) + '</p>' + render_table(analyses[k]);
+		}
+	}
+	return html;
+}
+
+function submit_job() {
+	$.ajax({
+		url: curLang + "/jobs",
+		data: {"sentence": $("#sentence").val(), "mode": mode},
+		type: "POST",
+		success: function(data) {
+			if (data.job_id) {
+				poll_job(data.job_id);
+			}
+			else {
+				process_response(data);
+			}
+		},
+		error: function(errorThrown) {
+			alert(JSON.stringify(errorThrown));
+			$('#analyze').toggleClass('btn-primary');
+		}
+	});
+}
+
+function poll_job(jobId) {
+	$.ajax({
+		url: "jobs/" + jobId,
+		type: "GET",
+		success: function(data) {
+			if (data.status == 'done') {
+				$.ajax({
+					url: "jobs/" + jobId + "/html",
+					type: "GET",
+					success: function(data) {
+						data.analysis = '<p><a href="jobs/' + jobId + '/docx">Download DOCX</a></p>' + data.analysis;
+						process_response(data);
+					}
+				});
+			}
+			else if (data.status == 'failed') {
+				process_response(data);
+			}
+			else {
+				$('#result').html('<p class="lead">Processed ' + data.progress.done + ' of ' + data.progress.total + ' examples...</p>');
+				setTimeout(function() { poll_job(jobId); }, 1000);
+			}
+		},
+		error: function(errorThrown) {
+			alert(JSON.stringify(errorThrown));
+			$('#analyze').toggleClass('btn-primary');
+		}
+	});
+}
+
 function process_keypress(e) {
 	if (e.key == "Enter") {
 		analyze();
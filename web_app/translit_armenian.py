@@ -1,4 +1,5 @@
 import re
+from .translit_engine import compile_rules
 
 dictArm2Lat = {'խ': 'x', 'ու': 'u', 'ւ': 'w',
                'է': 'ē', 'ր': 'r', 'տ': 't',
@@ -32,21 +33,17 @@ dictLat2Arm = {'x': 'խ', 'u': 'ու', 'w': 'ւ',
                'ž': 'ժ', 'z\'': 'ժ', 'z_': 'ժ'}
 
 
+meilletRules = [
+    ('replace', 'ու', 'u'),
+    ('replace', 'ու'.upper(), 'U'),
+    ('replace', 'Ու'.upper(), 'U'),
+    ('charmap', dictArm2Lat),
+]
+_translit_meillet = compile_rules(meilletRules)
+
+
 def armenian_translit_meillet(text):
-    text = text.replace('ու', 'u')
-    text = text.replace('ու'.upper(), 'U')
-    text = text.replace('Ու'.upper(), 'U')
-    textTrans = ''
-    for c in text:
-        try:
-            c = dictArm2Lat[c]
-        except KeyError:
-            try:
-                c = dictArm2Lat[c.lower()].upper()
-            except KeyError:
-                pass
-        textTrans += c
-    return textTrans
+    return _translit_meillet(text)
 
 
 def armenian_input_latin(field, text):
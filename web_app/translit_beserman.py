@@ -1,4 +1,5 @@
 import re
+from .translit_engine import compile_rules
 
 dic2cyr = {'a': 'а', 'b': 'б', 'v': 'в',
            'g': 'г', 'd': 'д', 'e': 'э',
@@ -41,6 +42,103 @@ cyrReplacements = {}
 srcReplacements = {}
 
 
+cyrillicRules = [
+    ('charmap', dic2cyr),
+    ('replace', 'h', 'х'),
+    ('replace', 'H', 'Х'),
+    ('regex', rxSoften, lambda m: cyrHard2Soft[m.group(1).lower()]),
+    ('regex', rxSh, 'с'),
+    ('regex', rxZh, 'з'),
+    ('regex', rxShCapital, 'С'),
+    ('regex', rxZhCapital, 'З'),
+    ('regex', rxVJV, lambda m: cyrHard2Soft[m.group(1).lower()]),
+    ('regex', rxVJV, lambda m: cyrHard2Soft[m.group(1).lower()]),
+    ('regex', rxJV, lambda m: cyrHard2Soft[m.group(1).lower()]),
+    ('regex', rxJVCapital, lambda m: cyrHard2Soft[m.group(1).lower()].upper()),
+    ('regex', rxNeutral1, lambda m: cyrHard2Soft[m.group(1).lower()]),
+    ('regex', rxNeutral2, '\\1и'),
+    ('regex', rxCJV, lambda m: 'ъ' + cyrHard2Soft[m.group(1).lower()]),
+    ('replace', 'ӟʼ', 'ӟ'),
+    ('replace', 'Ӟʼ', 'Ӟ'),
+    ('replace', 'чʼ', 'ч'),
+    ('replace', 'Чʼ', 'Ч'),
+    ('replace', 'ʼ', 'ь'),
+    ('regex', rxExtraSoft, '\\1\\1'),
+]
+ipaRules = [
+    ('replace', 'č', 'č'),
+    ('replace', 'Č', 'Č'),
+    ('replace', 'š', 'š'),
+    ('replace', 'Š', 'Š'),
+    ('replace', 'ž', 'ž'),
+    ('replace', 'Ž', 'Ž'),
+    ('replace', 'ǯ', 'ǯ'),
+    ('replace', 'Ǯ', 'Ǯ'),
+    ('replace', "'", 'ʼ'),
+    ('replace', 'ə', 'ʌ'),
+    ('replace', 'Ə', 'Ʌ'),
+    ('replace', 'ɤ', 'ɘ'),
+    ('replace', 'ü', 'ʉ'),
+    # ('replace', 'ɨ', 'i̮'),
+    # ('replace', 'Ɨ', 'I̮'),
+    ('replace', 'čʼ', 't͡ɕ'),
+    ('replace', 'Čʼ', 'T͡ɕ'),
+    ('replace', 'ǯʼ', 'd͡ʑ'),
+    ('replace', 'Ǯʼ', 'D͡ʑ'),
+    ('replace', 'šʼ', 'ɕ'),
+    ('replace', 'Šʼ', 'ɕ'),
+    ('replace', 'žʼ', 'ʑ'),
+    ('replace', 'Žʼ', 'ʑ'),
+    ('replace', 'č', 't͡ʂ'),
+    ('replace', 'Č', 'T͡ʂ'),
+    ('replace', 'ǯ', 'd͡ʐ'),
+    ('replace', 'Ǯ', 'D͡ʐ'),
+    ('replace', 'š', 'ʂ'),
+    ('replace', 'Š', 'ʂ'),
+    ('replace', 'ž', 'ʐ'),
+    ('replace', 'Ž', 'ʐ'),
+    ('replace', 'dʼ', 'dʲ'),
+    ('replace', 'Dʼ', 'Dʲ'),
+    ('replace', 'tʼ', 'tʲ'),
+    ('replace', 'Tʼ', 'Tʲ'),
+    ('replace', 'lʼ', 'lʲ'),
+    ('replace', 'Lʼ', 'Lʲ'),
+    ('replace', 'nʼ', 'nʲ'),
+    ('replace', 'Nʼ', 'Nʲ'),
+    ('replace', 'ʼ', 'ʲ'),
+    ('replace', 'c', 't͡s'),
+    ('replace', 'C', 'T͡s'),
+]
+upaRules = [
+    ('replace', "'", 'ʼ'),
+    ('replace', 'ə', 'ə̑'),
+    ('replace', 'Ə', 'Ə̑'),
+    ('replace', 'ɤ', 'e̮'),
+    ('replace', 'ɨ', 'i̮'),
+    ('replace', 'Ɨ', 'I̮'),
+    ('replace', 'čʼ', 'č́'),
+    ('replace', 'Čʼ', 'Č́'),
+    ('replace', 'ǯʼ', 'ǯ́'),
+    ('replace', 'Ǯʼ', 'Ǯ́'),
+    ('replace', 'šʼ', 'ś'),
+    ('replace', 'Šʼ', 'Ś'),
+    ('replace', 'žʼ', 'ź'),
+    ('replace', 'Žʼ', 'Ź'),
+    ('replace', 'dʼ', 'd́'),
+    ('replace', 'Dʼ', 'D́'),
+    ('replace', 'tʼ', 't́'),
+    ('replace', 'Tʼ', 'T́'),
+    ('replace', 'lʼ', 'ĺ'),
+    ('replace', 'Lʼ', 'Ĺ'),
+    ('replace', 'nʼ', 'ń'),
+    ('replace', 'Nʼ', 'Ń'),
+    ('replace', 'ʼ', '̓'),
+]
+_translit_cyrillic = compile_rules(cyrillicRules)
+_translit_ipa = compile_rules(ipaRules)
+_translit_upa = compile_rules(upaRules)
+
+
 def beserman_translit_cyrillic(text):
     """
     Transliterate Beserman text from dictionary Latin script to the Cyrillics.
@@ -48,110 +146,15 @@ def beserman_translit_cyrillic(text):
     if rxCyrillic.search(text) is not None:
         return text
 
-    letters = []
-    for letter in text:
-        if letter.lower() in dic2cyr:
-            if letter.islower():
-                letters.append(dic2cyr[letter.lower()])
-            else:
-                letters.append(dic2cyr[letter.lower()].upper())
-        else:
-            letters.append(letter)
-    res = ''.join(letters)
-    res = res.replace('h', 'х')
-    res = res.replace('H', 'Х')
-    res = rxSoften.sub(lambda m: cyrHard2Soft[m.group(1).lower()], res)
-    res = rxSh.sub('с', res)
-    res = rxZh.sub('з', res)
-    res = rxShCapital.sub('С', res)
-    res = rxZhCapital.sub('З', res)
-    res = rxVJV.sub(lambda m: cyrHard2Soft[m.group(1).lower()], res)
-    res = rxVJV.sub(lambda m: cyrHard2Soft[m.group(1).lower()], res)
-    res = rxJV.sub(lambda m: cyrHard2Soft[m.group(1).lower()], res)
-    res = rxJVCapital.sub(lambda m: cyrHard2Soft[m.group(1).lower()].upper(), res)
-    res = rxNeutral1.sub(lambda m: cyrHard2Soft[m.group(1).lower()], res)
-    res = rxNeutral2.sub('\\1и', res)
-    res = rxCJV.sub(lambda m: 'ъ' + cyrHard2Soft[m.group(1).lower()], res)
-    res = res.replace('ӟʼ', 'ӟ')
-    res = res.replace('Ӟʼ', 'Ӟ')
-    res = res.replace('чʼ', 'ч')
-    res = res.replace('Чʼ', 'Ч')
-    res = res.replace('ʼ', 'ь')
-    res = rxExtraSoft.sub('\\1\\1', res)
-
+    res = _translit_cyrillic(text)
     if res in cyrReplacements:
         res = cyrReplacements[res]
     return res
 
 
 def beserman_translit_ipa(text):
-    text = text.replace('č', 'č')
-    text = text.replace('Č', 'Č')
-    text = text.replace('š', 'š')
-    text = text.replace('Š', 'Š')
-    text = text.replace('ž', 'ž')
-    text = text.replace('Ž', 'Ž')
-    text = text.replace('ǯ', 'ǯ')
-    text = text.replace('Ǯ', 'Ǯ')
-    text = text.replace("'", 'ʼ')
-    text = text.replace('ə', 'ʌ')
-    text = text.replace('Ə', 'Ʌ')
-    text = text.replace('ɤ', 'ɘ')
-    text = text.replace('ü', 'ʉ')
-    # text = text.replace('ɨ', 'i̮')
-    # text = text.replace('Ɨ', 'I̮')
-    text = text.replace('čʼ', 't͡ɕ')
-    text = text.replace('Čʼ', 'T͡ɕ')
-    text = text.replace('ǯʼ', 'd͡ʑ')
-    text = text.replace('Ǯʼ', 'D͡ʑ')
-    text = text.replace('šʼ', 'ɕ')
-    text = text.replace('Šʼ', 'ɕ')
-    text = text.replace('žʼ', 'ʑ')
-    text = text.replace('Žʼ', 'ʑ')
-    text = text.replace('č', 't͡ʂ')
-    text = text.replace('Č', 'T͡ʂ')
-    text = text.replace('ǯ', 'd͡ʐ')
-    text = text.replace('Ǯ', 'D͡ʐ')
-    text = text.replace('š', 'ʂ')
-    text = text.replace('Š', 'ʂ')
-    text = text.replace('ž', 'ʐ')
-    text = text.replace('Ž', 'ʐ')
-    text = text.replace('dʼ', 'dʲ')
-    text = text.replace('Dʼ', 'Dʲ')
-    text = text.replace('tʼ', 'tʲ')
-    text = text.replace('Tʼ', 'Tʲ')
-    text = text.replace('lʼ', 'lʲ')
-    text = text.replace('Lʼ', 'Lʲ')
-    text = text.replace('nʼ', 'nʲ')
-    text = text.replace('Nʼ', 'Nʲ')
-    text = text.replace('ʼ', 'ʲ')
-    text = text.replace('c', 't͡s')
-    text = text.replace('C', 'T͡s')
-    return text
+    return _translit_ipa(text)
 
 
 def beserman_translit_upa(text):
-    text = text.replace("'", 'ʼ')
-    text = text.replace('ə', 'ə̑')
-    text = text.replace('Ə', 'Ə̑')
-    text = text.replace('ɤ', 'e̮')
-    text = text.replace('ɨ', 'i̮')
-    text = text.replace('Ɨ', 'I̮')
-    text = text.replace('čʼ', 'č́')
-    text = text.replace('Čʼ', 'Č́')
-    text = text.replace('ǯʼ', 'ǯ́')
-    text = text.replace('Ǯʼ', 'Ǯ́')
-    text = text.replace('šʼ', 'ś')
-    text = text.replace('Šʼ', 'Ś')
-    text = text.replace('žʼ', 'ź')
-    text = text.replace('Žʼ', 'Ź')
-    text = text.replace('dʼ', 'd́')
-    text = text.replace('Dʼ', 'D́')
-    text = text.replace('tʼ', 't́')
-    text = text.replace('Tʼ', 'T́')
-    text = text.replace('lʼ', 'ĺ')
-    text = text.replace('Lʼ', 'Ĺ')
-    text = text.replace('nʼ', 'ń')
-    text = text.replace('Nʼ', 'Ń')
-    text = text.replace('ʼ', '̓')
-    return text
\ No newline at end of file
+    return _translit_upa(text)
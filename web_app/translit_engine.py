@@ -0,0 +1,213 @@
+import re
+
+# Transliteration rules are written as an ordered list of tuples:
+#   ('replace', src, dst)        -- text = text.replace(src, dst)
+#   ('charmap', mapping)         -- replace each character whose lowercase
+#                                   version is in mapping; the replacement is
+#                                   uppercased if the character is not lowercase
+#   ('regex', rx, repl)          -- text = rx.sub(repl, text)
+# compile_rules() turns such a list into a function. Each run of consecutive
+# 'replace' and 'charmap' rules that contains a 'charmap' is compiled into one
+# table of substrings and their final replacements, which is applied in a single
+# left-to-right longest-match pass instead of one pass per rule: substrings
+# longer than one character are found with one trie-shaped regex, and the text
+# between them is transliterated character by character with str.translate().
+# Runs of 'replace' rules alone are left as they are and still take one pass
+# per rule (this is the case of beserman_translit_ipa() and
+# beserman_translit_upa(), which consist of such rules only): for strings
+# as short as words and sentences, a chain of str.replace() calls, each of
+# which is a fast scan in C, is quicker than a regex-driven pass. 'regex'
+# rules depend on the context, so they are applied as they are too.
+# tests/test_translit.py compares the output with frozen input/output pairs.
+
+MAX_KEY_LENGTH = 6
+
+_uppercaseVariants = None
+
+
+def uppercase_variants():
+    """
+    Return a dictionary whose keys are characters and values are sets of all
+    other BMP characters that turn into that character when lowercased.
+    """
+    global _uppercaseVariants
+    if _uppercaseVariants is None:
+        _uppercaseVariants = {}
+        for i in range(0x10000):
+            c = chr(i)
+            cLower = c.lower()
+            if cLower != c and len(cLower) == 1:
+                _uppercaseVariants.setdefault(cLower, set()).add(c)
+    return _uppercaseVariants
+
+
+def apply_local_rules(rules, text):
+    """
+    Apply 'replace' and 'charmap' rules to the text one by one.
+    """
+    for rule in rules:
+        if rule[0] == 'replace':
+            text = text.replace(rule[1], rule[2])
+        else:
+            mapping = rule[1]
+            letters = []
+            for letter in text:
+                if letter.lower() in mapping:
+                    if letter.islower():
+                        letters.append(mapping[letter.lower()])
+                    else:
+                        letters.append(mapping[letter.lower()].upper())
+                else:
+                    letters.append(letter)
+            text = ''.join(letters)
+    return text
+
+
+def trie_regex(keys):
+    """
+    Build a regex that matches the longest of the keys at a given position
+    and captures it (so that it can be used with split()).
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for c in key:
+            node = node.setdefault(c, {})
+        node[''] = True
+
+    def node2regex(node):
+        alternatives = [re.escape(c) + node2regex(child)
+                        for c, child in sorted(node.items()) if c != '']
+        if len(alternatives) <= 0:
+            return ''
+        if len(alternatives) == 1:
+            regex = alternatives[0]
+            if len(regex) > 1:
+                regex = '(?:' + regex + ')'
+        else:
+            regex = '(?:' + '|'.join(alternatives) + ')'
+        if '' in node:
+            regex += '?'
+        return regex
+
+    return re.compile('(' + node2regex(trie) + ')', flags=re.DOTALL)
+
+
+class SinglePassStage:
+    """
+    A compiled run of 'replace' and 'charmap' rules.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        alphabet = set()
+        keys = set()
+        for rule in rules:
+            if rule[0] == 'replace':
+                alphabet |= set(rule[1])
+                keys.add(rule[1])
+            else:
+                alphabet |= set(k for k in rule[1] if len(k) == 1)
+        for c in list(alphabet):
+            alphabet |= uppercase_variants().get(c, set())
+            alphabet |= set(c.upper() + c.lower())
+        self.table = {}
+        for c in alphabet:
+            self.table[c] = apply_local_rules(rules, c)
+        for key in keys:
+            self.table[key] = apply_local_rules(rules, key)
+        self.table = {k: v for k, v in self.table.items() if k != v or len(k) > 1}
+        # Add longer keys where the rules produce something different
+        # from what the current table would produce.
+        newKeys = set(self.table)
+        while len(newKeys) > 0:
+            candidates = set()
+            for key in newKeys:
+                if len(key) >= MAX_KEY_LENGTH:
+                    continue
+                for c in alphabet:
+                    candidates.add(key + c)
+                    candidates.add(c + key)
+            self.compile_table()
+            newKeys = set()
+            for candidate in candidates:
+                if candidate in self.table:
+                    continue
+                result = apply_local_rules(rules, candidate)
+                if result != self.apply(candidate):
+                    newKeys.add(candidate)
+            for key in newKeys:
+                self.table[key] = apply_local_rules(rules, key)
+        self.compile_table()
+
+    def compile_table(self):
+        self.charTable = str.maketrans({k: v for k, v in self.table.items() if len(k) == 1})
+        self.rxKeys = None
+        longKeys = [k for k in self.table if len(k) > 1]
+        if len(longKeys) > 0:
+            self.rxKeys = trie_regex(longKeys)
+
+    def apply(self, text):
+        if self.rxKeys is None:
+            return text.translate(self.charTable)
+        parts = self.rxKeys.split(text)
+        for i in range(len(parts)):
+            if i % 2 == 0:
+                parts[i] = parts[i].translate(self.charTable)
+            else:
+                parts[i] = self.table[parts[i]]
+        return ''.join(parts)
+
+
+class ReplaceStage:
+    """
+    A run of 'replace' rules applied one by one.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def apply(self, text):
+        for rule in self.rules:
+            text = text.replace(rule[1], rule[2])
+        return text
+
+
+class RegexStage:
+    def __init__(self, rx, repl):
+        self.rx = rx
+        self.repl = repl
+
+    def apply(self, text):
+        return self.rx.sub(self.repl, text)
+
+
+def compile_rules(rules):
+    """
+    Compile a list of transliteration rules into a function
+    that takes a string and returns its transliteration.
+    """
+    def local_stage(localRules):
+        if any(rule[0] == 'charmap' for rule in localRules):
+            return SinglePassStage(localRules)
+        return ReplaceStage(localRules)
+
+    stages = []
+    localRules = []
+    for rule in rules:
+        if rule[0] in ('replace', 'charmap'):
+            localRules.append(rule)
+            continue
+        if len(localRules) > 0:
+            stages.append(local_stage(localRules))
+            localRules = []
+        stages.append(RegexStage(rule[1], rule[2]))
+    if len(localRules) > 0:
+        stages.append(local_stage(localRules))
+
+    def transliterate(text):
+        for stage in stages:
+            text = stage.apply(text)
+        return text
+
+    return transliterate
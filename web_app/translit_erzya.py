@@ -1,4 +1,5 @@
 import re
+from .translit_engine import compile_rules
 
 cyr2upa = {'я': 'ʼa', 'е': 'ʼe', 'ѣ': 'ʼe', 'и': 'ʼi',
            'ё': 'ʼo', 'ю': 'ʼu', 'ь': 'ʼ', 'і': 'ʼi',
@@ -18,48 +19,46 @@ rxCyrMultSoften = re.compile('ʼ{2,}')
 rxCyrVSoft = re.compile('([aeiou]|\\b)ʼ', flags=re.I)
 
 
+upaRules = [
+    ('regex', rxYer, ''),
+    ('replace', 'жи', 'жӥ'),
+    ('replace', 'ши', 'шӥ'),
+    ('replace', 'же', 'жэ'),
+    ('replace', 'ше', 'шэ'),
+    ('replace', 'Жи', 'Жӥ'),
+    ('replace', 'Ши', 'Шӥ'),
+    ('replace', 'Же', 'Жэ'),
+    ('replace', 'Ше', 'Шэ'),
+    ('charmap', cyr2upa),
+    ('regex', rxCyrVJV, '\\1j\\2'),
+    ('regex', rxCyrJV, 'j\\1'),
+    ('replace', 'ъʼ', 'j'),
+    ('regex', rxCyrNeutral, ''),
+    ('regex', rxCyrRegressiveSoft, '\\1ʼ\\2'),
+    ('regex', rxCyrRegressiveSoft, '\\1ʼ\\2'),
+    ('regex', rxCyrRegressiveSoft, '\\1ʼ\\2'),
+    ('regex', rxCyrRegressiveSoft, '\\1ʼ\\2'),
+    ('regex', rxCyrRegressiveSoft, '\\1ʼ\\2'),
+    ('regex', rxCyrMultSoften, 'ʼ'),
+    ('regex', rxCyrVSoft, '\\1'),
+    ('replace', 'sʼ', 'ś'),
+    ('replace', 'zʼ', 'ź'),
+    ('replace', 'čʼ', 'č'),
+    ('replace', 'nʼ', 'ń'),
+    ('replace', 'cʼ', 'ć'),
+    ('replace', 'rʼ', 'ŕ'),
+    ('replace', 'Sʼ', 'Ś'),
+    ('replace', 'Zʼ', 'Ź'),
+    ('replace', 'Čʼ', 'Č'),
+    ('replace', 'Nʼ', 'Ń'),
+    ('replace', 'Cʼ', 'Ć'),
+    ('replace', 'Rʼ', 'Ŕ'),
+]
+_translit_upa = compile_rules(upaRules)
+
+
 def erzya_translit_upa(text):
     """
     Transliterate Erzya text from Cyrillic script to Latin UPA.
     """
-    text = rxYer.sub('', text)
-    text = text.replace('жи', 'жӥ')
-    text = text.replace('ши', 'шӥ')
-    text = text.replace('же', 'жэ')
-    text = text.replace('ше', 'шэ')
-    text = text.replace('Жи', 'Жӥ')
-    text = text.replace('Ши', 'Шӥ')
-    text = text.replace('Же', 'Жэ')
-    text = text.replace('Ше', 'Шэ')
-
-    letters = []
-    for letter in text:
-        if letter.lower() in cyr2upa:
-            if letter.islower():
-                letters.append(cyr2upa[letter.lower()])
-            else:
-                letters.append(cyr2upa[letter.lower()].upper())
-        else:
-            letters.append(letter)
-    res = ''.join(letters)
-    res = rxCyrVJV.sub('\\1j\\2', res)
-    res = rxCyrJV.sub('j\\1', res)
-    res = res.replace('ъʼ', 'j')
-    res = rxCyrNeutral.sub('', res)
-    for i in range(5):
-        res = rxCyrRegressiveSoft.sub('\\1ʼ\\2', res)
-    res = rxCyrMultSoften.sub('ʼ', res)
-    res = rxCyrVSoft.sub('\\1', res)
-    res = res.replace('sʼ', 'ś')
-    res = res.replace('zʼ', 'ź')
-    res = res.replace('čʼ', 'č')
-    res = res.replace('nʼ', 'ń')
-    res = res.replace('cʼ', 'ć')
-    res = res.replace('rʼ', 'ŕ')
-    res = res.replace('Sʼ', 'Ś')
-    res = res.replace('Zʼ', 'Ź')
-    res = res.replace('Čʼ', 'Č')
-    res = res.replace('Nʼ', 'Ń')
-    res = res.replace('Cʼ', 'Ć')
-    res = res.replace('Rʼ', 'Ŕ')
-    return res
+    return _translit_upa(text)
@@ -1,4 +1,5 @@
 import re
+from .translit_engine import compile_rules
 
 dic2cyr = {'a': 'а', 'b': 'б', 'v': 'в',
            'g': 'г', 'd': 'д', 'e': 'э',
@@ -39,60 +40,55 @@ cyrReplacements = {}
 srcReplacements = {}
 
 
+upaRules = [
+    ('replace', 'жи', 'жӥ'),
+    ('replace', 'ӝи', 'ӝӥ'),
+    ('replace', 'ӟи', 'ӟӥ'),
+    ('replace', 'чи', 'чӥ'),
+    ('replace', 'ӵи', 'ӵӥ'),
+    ('replace', 'ши', 'шӥ'),
+    ('replace', 'же', 'жэ'),
+    ('replace', 'ӝе', 'ӝэ'),
+    ('replace', 'ӟе', 'ӟэ'),
+    ('replace', 'че', 'чэ'),
+    ('replace', 'ӵе', 'ӵэ'),
+    ('replace', 'ше', 'шэ'),
+    ('replace', 'Жи', 'Жӥ'),
+    ('replace', 'Ӝи', 'Ӝӥ'),
+    ('replace', 'Ӟи', 'Ӟӥ'),
+    ('replace', 'Ши', 'Шӥ'),
+    ('replace', 'Же', 'Жэ'),
+    ('replace', 'Ӝе', 'Ӝэ'),
+    ('replace', 'Ӟе', 'Ӟэ'),
+    ('replace', 'Че', 'Чэ'),
+    ('replace', 'Ӵе', 'Ӵэ'),
+    ('replace', 'Ше', 'Шэ'),
+    ('charmap', cyr2dic),
+    ('regex', rxCyrVJV, '\\1j\\2'),
+    ('regex', rxCyrJV, 'j\\1'),
+    ('replace', 'ъʼ', 'j'),
+    ('replace', 'sʼ', 'šʼ'),
+    ('replace', 'zʼ', 'žʼ'),
+    ('regex', rxCyrNeutral, ''),
+    ('regex', rxCyrExtraSoft, '\\1ʼ\\1'),
+    ('replace', 'sšʼ', 'šʼšʼ'),
+    ('replace', 'zžʼ', 'žʼžʼ'),
+    ('regex', rxCyrMultSoften, 'ʼ'),
+    ('regex', rxCyrVSoft, '\\1'),
+    ('replace', 'šʼ', 'ś'),
+    ('replace', 'žʼ', 'ź'),
+    ('replace', 'čʼ', 'č́'),
+    ('replace', 'nʼ', 'ń'),
+    ('replace', 'Šʼ', 'Ś'),
+    ('replace', 'Žʼ', 'Ź'),
+    ('replace', 'Čʼ', 'Č́'),
+    ('replace', 'Nʼ', 'Ń'),
+]
+_translit_upa = compile_rules(upaRules)
+
+
 def udmurt_translit_upa(text):
     """
     Transliterate Udmurt text from Cyrillic script to Latin UPA.
     """
-    text = text.replace('жи', 'жӥ')
-    text = text.replace('ӝи', 'ӝӥ')
-    text = text.replace('ӟи', 'ӟӥ')
-    text = text.replace('чи', 'чӥ')
-    text = text.replace('ӵи', 'ӵӥ')
-    text = text.replace('ши', 'шӥ')
-    text = text.replace('же', 'жэ')
-    text = text.replace('ӝе', 'ӝэ')
-    text = text.replace('ӟе', 'ӟэ')
-    text = text.replace('че', 'чэ')
-    text = text.replace('ӵе', 'ӵэ')
-    text = text.replace('ше', 'шэ')
-    text = text.replace('Жи', 'Жӥ')
-    text = text.replace('Ӝи', 'Ӝӥ')
-    text = text.replace('Ӟи', 'Ӟӥ')
-    text = text.replace('Ши', 'Шӥ')
-    text = text.replace('Же', 'Жэ')
-    text = text.replace('Ӝе', 'Ӝэ')
-    text = text.replace('Ӟе', 'Ӟэ')
-    text = text.replace('Че', 'Чэ')
-    text = text.replace('Ӵе', 'Ӵэ')
-    text = text.replace('Ше', 'Шэ')
-
-    letters = []
-    for letter in text:
-        if letter.lower() in cyr2dic:
-            if letter.islower():
-                letters.append(cyr2dic[letter.lower()])
-            else:
-                letters.append(cyr2dic[letter.lower()].upper())
-        else:
-            letters.append(letter)
-    res = ''.join(letters)
-    res = rxCyrVJV.sub('\\1j\\2', res)
-    res = rxCyrJV.sub('j\\1', res)
-    res = res.replace('ъʼ', 'j')
-    res = res.replace('sʼ', 'šʼ')
-    res = res.replace('zʼ', 'žʼ')
-    res = rxCyrNeutral.sub('', res)
-    res = rxCyrExtraSoft.sub('\\1ʼ\\1', res)
-    res = res.replace('sšʼ', 'šʼšʼ')
-    res = res.replace('zžʼ', 'žʼžʼ')
-    res = rxCyrMultSoften.sub('ʼ', res)
-    res = rxCyrVSoft.sub('\\1', res)
-    res = res.replace('šʼ', 'ś')
-    res = res.replace('žʼ', 'ź')
-    res = res.replace('čʼ', 'č́')
-    res = res.replace('nʼ', 'ń')
-    res = res.replace('Šʼ', 'Ś')
-    res = res.replace('Žʼ', 'Ź')
-    res = res.replace('Čʼ', 'Č́')
-    res = res.replace('Nʼ', 'Ń')
-    return res
+    return _translit_upa(text)
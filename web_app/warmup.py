@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from .metrics import WARMUP_SECONDS
+
+
+def read_frequency_list(fname, topN):
+    """
+    Read a frequency list: one wordform per line, optionally followed
+    by a tab and its frequency. If there are no frequencies, the list
+    is assumed to be sorted already. Return at most topN wordforms.
+    """
+    forms = []
+    with open(fname, 'r', encoding='utf-8') as fIn:
+        for line in fIn:
+            parts = line.rstrip('\r\n').split('\t')
+            if len(parts[0].strip()) <= 0:
+                continue
+            freq = 0
+            if len(parts) > 1:
+                try:
+                    freq = float(parts[1])
+                except ValueError:
+                    pass
+            forms.append((parts[0].strip(), freq))
+    # sorted() is stable, so lists without frequencies keep their order
+    forms = sorted(forms, key=lambda x: -x[1])
+    return [form for form, freq in forms[:topN]]
+
+
+def query_log_frequencies(analyzer, fname, backupCount):
+    """
+    Count the tokens of the queries in the query log and its rotated
+    copies. Return a dictionary {lang: Counter}.
+    """
+    freqs = {}
+    fnames = [fname] + [fname + '.' + str(i) for i in range(1, backupCount + 1)]
+    for fname in fnames:
+        if not os.path.exists(fname):
+            continue
+        with open(fname, 'r', encoding='utf-8') as fIn:
+            for line in fIn:
+                try:
+                    record = json.loads(line)
+                    lang = record['lang']
+                    text = record['query']['sentence']
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if lang not in analyzer.langs:
+                    continue
+                if lang not in freqs:
+                    freqs[lang] = Counter()
+                for textLine in text.split('\n'):
+                    freqs[lang].update(t for t in analyzer.tokenize(textLine)
+                                       if analyzer.rxWord.search(t) is not None)
+    return freqs
+
+
+class Warmup:
+    """
+    Pre-analyzes the most frequent wordforms of each language at startup,
+    which fills the token and transliteration caches (and the persistent
+    analysis store, if there is one). Analyses of languages with
+    disambiguation depend on the context and are never cached, so for them
+    the grammar is only loaded and the transliterations of the wordforms
+    are memoized. The wordforms
+    are taken from frequency lists given in the settings and/or from
+    the query log.
+    """
+    chunkSize = 1000
+
+    def __init__(self, analyzer, settings):
+        self.analyzer = analyzer
+        self.settings = settings
+        self.status = {}    # lang -> {'status': ..., 'forms': ..., 'seconds': ...}
+
+    def wordforms(self):
+        """
+        Return a dictionary {lang: list of wordforms to pre-analyze}.
+        """
+        topN = self.settings['warmup_top_n']
+        forms = {}
+        for lang, fname in self.settings['warmup_frequency_lists'].items():
+            if lang in self.analyzer.langs and os.path.exists(fname):
+                forms[lang] = read_frequency_list(fname, topN)
+        if self.settings['warmup_from_query_log']:
+            freqs = query_log_frequencies(self.analyzer, self.settings['query_log_file'],
+                                          self.settings['query_log_backups'])
+            for lang, langFreqs in freqs.items():
+                langForms = forms.get(lang, [])
+                if len(langForms) < topN:
+                    known = set(langForms)
+                    langForms += [form for form, freq in langFreqs.most_common()
+                                  if form not in known][:topN - len(langForms)]
+                forms[lang] = langForms
+        return forms
+
+    def warm_up_language(self, lang, forms):
+        self.status[lang] = {'status': 'running', 'forms': len(forms), 'seconds': 0}
+        start = time.perf_counter()
+        if lang in self.analyzer.disamb_langs:
+            # The grammar is loaded all the same, so that the first
+            # request does not have to wait for it
+            self.analyzer.get_analyzer(lang)
+            for f in self.analyzer.langs[lang].get('translit', {}).values():
+                for form in forms:
+                    f(form)
+            action = 'transliterated'
+        else:
+            for iStart in range(0, len(forms), self.chunkSize):
+                # Each chunk is analyzed as one tokenized sentence
+                self.analyzer.analyze_batch(lang, [forms[iStart:iStart + self.chunkSize]])
+            action = 'analyzed'
+        seconds = time.perf_counter() - start
+        self.status[lang] = {'status': 'done', 'forms': len(forms), 'seconds': seconds}
+        WARMUP_SECONDS.set(seconds, lang=lang)
+        sys.stderr.write('Warmup: ' + str(len(forms)) + ' ' + lang
+                         + ' wordforms ' + action + ' in ' + str(round(seconds, 1)) + ' s.\n')
+
+    def run(self):
+        for lang, forms in self.wordforms().items():
+            try:
+                self.warm_up_language(lang, forms)
+            except Exception as e:
+                self.status[lang] = {'status': 'failed', 'error': str(e)}
+                sys.stderr.write('Warmup of ' + lang + ' failed: ' + str(e) + '\n')
+
+    def start(self):
+        """
+        Run the warmup, in a background thread if the settings say so,
+        so that the app can start serving requests immediately.
+        """
+        if self.settings['warmup_background']:
+            threading.Thread(target=self.run, daemon=True).start()
+        else:
+            self.run()